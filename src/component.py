@@ -5,11 +5,13 @@ Jira JQL queries for given component
 import argparse
 import datetime
 import getpass
-import json
 import logging
 import sys
 
-from jira import Jira
+import planner
+import recorder
+import transport
+from jira import Jira, API_AUTO, API_CLOUD, API_SERVER, WORKERS, PAGE_SECONDS
 
 PROGNAME = "component"
 EXAMPLES = ""
@@ -20,6 +22,13 @@ DEFAULT_COMPONENT = "YOUR_PROJECT_COMPONENT"  # Replace with your project compon
 DEFAULT_PREFIX = "YOUR_LABEL_PREFIX"  # Replace with your label prefix
 DEFAULT_TEAM = ["YOUR", "TEAM", "MEMBERS"]  # Replace with your team members
 DEFAULT_YEARS = 5  # Replace with your number of maximum years
+ERROR = "ERR"  # Shown instead of a value which could not be retrieved
+STATS_AUTO = "auto"  # Let the planner choose the cheapest strategy per table
+STATS_COUNT = planner.COUNT  # Two count requests per year
+STATS_GADGET = planner.GADGET  # One created vs resolved gadget request for all years
+STATS_MATRIX = planner.MATRIX  # Two filter statistics requests per year for all rows
+STATS_BULK = planner.BULK  # Fetch all issues once and aggregate locally
+DEFAULT_STATS = STATS_AUTO
 
 
 def section(title):
@@ -42,6 +51,15 @@ def echo(result=None, limit=2000):
         logging.error("NO RESULT!!!")
 
 
+def cell(created, resolved):
+    """
+    Format created/resolved table cell, failed values are shown as errors
+    """
+    created = ERROR if created is None else created
+    resolved = ERROR if resolved is None else resolved
+    return f"{created}/{resolved}"
+
+
 def connect(options):
     """
     Connect to Jira
@@ -49,7 +67,9 @@ def connect(options):
     section("Connecting to " + options.url)
     jira = Jira(options.url,
                 options.username, options.password,
-                options.token, options.netrc)
+                options.token, options.netrc,
+                transport.from_options(options),
+                options.api, options.workers, options.page_seconds)
     if not jira.open():
         section("Fail")
         return None
@@ -70,7 +90,119 @@ def get_labels(jira, options):
     return all_labels
 
 
-def assignee_statistics(jira, options, assignee):
+def gadget_statistics(jira, options, query):
+    """
+    Collect annual statistics with single gadget request, None if unavailable
+    """
+    series = jira.created_vs_resolved(query, options.years)
+    if series is None:
+        return None
+    current_year = datetime.date.today().year
+    data = []
+    for year in range(current_year, current_year - options.years, -1):
+        counts = series.get(year, {})
+        data.append({
+            "year": year,
+            "created": counts.get("created", 0),
+            "resolved": counts.get("resolved", 0),
+        })
+    return data
+
+
+def matrix_statistics(jira, options, query, stattype, names):
+    """
+    Collect annual statistics for names (assignees or labels) with two
+    filter statistics requests per year, None if unavailable; names never
+    found in the matrix (e.g. username instead of display name) are left out
+    """
+    current_year = datetime.date.today().year
+    years = []
+    for year in range(current_year, current_year - options.years, -1):
+        created = f" AND created >= '{year}/01/01'"
+        created += f" AND created <= '{year + 1}/01/01'"
+        resolved = f" AND resolved >= '{year}/01/01'"
+        resolved += f" AND resolved <= '{year + 1}/01/01'"
+        issues_created = jira.filter_statistics(query + created, stattype)
+        if issues_created is None:
+            return None
+        issues_resolved = jira.filter_statistics(query + resolved, stattype)
+        if issues_resolved is None:
+            return None
+        years.append((year, issues_created, issues_resolved))
+    found = set()
+    for _, issues_created, issues_resolved in years:
+        found.update(issues_created, issues_resolved)
+    statistics = {}
+    for name in names:
+        if name not in found:
+            logging.warning("%s not found in filter statistics, using counts", name)
+            continue
+        statistics[name] = [{
+            "year": year,
+            "created": issues_created.get(name, 0),
+            "resolved": issues_resolved.get(name, 0),
+        } for year, issues_created, issues_resolved in years]
+    return statistics
+
+
+def recent(options):
+    """
+    Return JQL condition for issues created or resolved in the reported years
+    """
+    first_year = datetime.date.today().year - options.years + 1
+    return f" AND (created >= '{first_year}/01/01' OR resolved >= '{first_year}/01/01')"
+
+
+def issue_names(issue, field):
+    """
+    Return labels or assignee names of the issue
+    """
+    fields = issue.get("fields") or {}
+    if field == "labels":
+        return set(fields.get("labels") or [])
+    assignee = fields.get("assignee") or {}
+    return {assignee.get("displayName"), assignee.get("name")}
+
+
+def bulk_statistics(jira, options, query, field, names, total=None):
+    """
+    Collect annual statistics for all names (assignees or labels) from one
+    bulk search aggregated locally, None on failure
+    """
+    issues = jira.search(query, fields=f"created,resolutiondate,{field}",
+                         total=total, large=True)
+    if issues is None:
+        return None
+    current_year = datetime.date.today().year
+    years = range(current_year, current_year - options.years, -1)
+    counts = {name: {year: {"created": 0, "resolved": 0} for year in years} for name in names}
+    for issue in issues:
+        fields = issue.get("fields") or {}
+        created = (fields.get("created") or "")[:4]
+        resolved = (fields.get("resolutiondate") or "")[:4]
+        for name in issue_names(issue, field) & counts.keys():
+            if created.isdigit() and int(created) in counts[name]:
+                counts[name][int(created)]["created"] += 1
+            if resolved.isdigit() and int(resolved) in counts[name]:
+                counts[name][int(resolved)]["resolved"] += 1
+    return {
+        name: [dict(counts[name][year], year=year) for year in years]
+        for name in names
+    }
+
+
+def choose_mode(jira, options, table, rows, bulk_query):
+    """
+    Return statistics mode and plan, planned only in auto mode
+    """
+    if options.stats_mode != STATS_AUTO:
+        return options.stats_mode, None
+    plan = planner.Planner(jira, options.allow_filters).plan_statistics(
+        table, rows, options.years, bulk_query)
+    return plan.strategy, plan
+
+
+def assignee_statistics(jira, options, assignee, mode=STATS_COUNT):
     """
     Collect assignee statistics
     """
@@ -79,15 +211,19 @@ def assignee_statistics(jira, options, assignee):
     max_years = options.years
     current_year = datetime.date.today().year
     year = current_year
+    common = f"project = '{project_key}'"
+    # common += f" AND component in ('{component}')"
+    assign = f" AND assignee='{assignee}'"
+    if mode == STATS_GADGET:
+        data = gadget_statistics(jira, options, common + assign)
+        if data is not None:
+            return data
     data = []
     while year > current_year - max_years:
-        common = f"project = '{project_key}'"
-        # common += f" AND component in ('{component}')"
         created = f" AND created >= '{year}/01/01'"
         created += f" AND created <= '{year + 1}/01/01'"
         resolved = f" AND resolved >= '{year}/01/01'"
         resolved += f" AND resolved <= '{year + 1}/01/01'"
-        assign = f" AND assignee='{assignee}'"
         issues_created = jira.count(common + created + assign)
         issues_resolved = jira.count(common + resolved + assign)
         data.append({
@@ -99,16 +235,36 @@ def assignee_statistics(jira, options, assignee):
     return data
 
 
+def collect_team(jira, options):
+    """
+    Return created/resolved statistics for every assignee in the team
+    """
+    if not options.team:
+        return {}
+    query = f"project = '{options.project}'"
+    query += " AND assignee in (%s)" % ", ".join(f"'{name}'" for name in options.team)
+    mode, plan = choose_mode(jira, options, "assignees", len(options.team),
+                             query + recent(options))
+    with planner.track(jira, plan):
+        statistics = None
+        if mode == STATS_BULK:
+            statistics = bulk_statistics(jira, options, query + recent(options), "assignee",
+                                         options.team, plan and plan.total)
+        elif mode == STATS_MATRIX:
+            statistics = matrix_statistics(jira, options, query, "assignees", options.team)
+        statistics = statistics or {}
+        for assignee in options.team:
+            if assignee not in statistics:
+                statistics[assignee] = assignee_statistics(jira, options, assignee, mode)
+    return {assignee: statistics[assignee] for assignee in options.team}
+
+
 def team_statistics(jira, options):
     """
     Collect creared/resolved assignee statistics
     """
     section("Created/Resolved annual statistics for assignees")
-    assignees = options.team
-    statistics = {}
-    for assignee in assignees:
-        data = assignee_statistics(jira, options, assignee)
-        statistics[assignee] = data
+    statistics = collect_team(jira, options)
     years = ""
     for assignee in statistics:
         for data in statistics[assignee]:
@@ -121,12 +277,12 @@ def team_statistics(jira, options):
         for data in statistics[assignee]:
             created = data["created"]
             resolved = data["resolved"]
-            line += "%10s" % f"{created}/{resolved}"
+            line += "%10s" % cell(created, resolved)
         logging.info(line)
     section("Done")
 
 
-def label_statistics(jira, options, label):
+def label_statistics(jira, options, label, mode=STATS_COUNT):
     """
     Collect label statistics
     """
@@ -135,15 +291,19 @@ def label_statistics(jira, options, label):
     max_years = options.years
     current_year = datetime.date.today().year
     year = current_year
+    common = f"project = '{project_key}'"
+    common += f" AND component in ('{component}')"
+    labels = f" AND labels in ('{label}')"
+    if mode == STATS_GADGET:
+        data = gadget_statistics(jira, options, common + labels)
+        if data is not None:
+            return data
     data = []
     while year > current_year - max_years:
-        common = f"project = '{project_key}'"
-        common += f" AND component in ('{component}')"
         created = f" AND created >= '{year}/01/01'"
         created += f" AND created <= '{year + 1}/01/01'"
         resolved = f" AND resolved >= '{year}/01/01'"
         resolved += f" AND resolved <= '{year + 1}/01/01'"
-        labels = f" AND labels in ('{label}')"
         issues_created = jira.count(common + created + labels)
         issues_resolved = jira.count(common + resolved + labels)
         data.append({
@@ -162,9 +322,23 @@ def all_statistics(jira, options):
     section("Created/Resolved annual statistics for labels")
     labels = get_labels(jira, options)
     statistics = {}
-    for label in labels:
-        data = label_statistics(jira, options, label)
-        statistics[label] = data
+    if labels:
+        query = f"project = '{options.project}'"
+        query += f" AND component in ('{options.component}')"
+        query += " AND labels in (%s)" % ", ".join(f"'{label}'" for label in labels)
+        mode, plan = choose_mode(jira, options, "labels", len(labels), query + recent(options))
+        with planner.track(jira, plan):
+            statistics = None
+            if mode == STATS_BULK:
+                statistics = bulk_statistics(jira, options, query + recent(options), "labels",
+                                             labels, plan and plan.total)
+            elif mode == STATS_MATRIX:
+                statistics = matrix_statistics(jira, options, query, "labels", labels)
+            statistics = statistics or {}
+            for label in labels:
+                if label not in statistics:
+                    statistics[label] = label_statistics(jira, options, label, mode)
+            statistics = {label: statistics[label] for label in labels}
     years = ""
     for label in statistics:
         for data in statistics[label]:
@@ -177,7 +351,7 @@ def all_statistics(jira, options):
         for data in statistics[label]:
             created = data["created"]
             resolved = data["resolved"]
-            line += "%10s" % f"{created}/{resolved}"
+            line += "%10s" % cell(created, resolved)
         logging.info(line)
     section("Done")
 
@@ -196,22 +370,29 @@ def label_estimates(jira, options, label):
     # query += f" AND created >= '{year}/01/01'"
     # query += f" AND created <= '{year + 1}/01/01'"
     query += f" AND labels in ('{label}')"
-    data = jira.jql(query, max_results=500, fields="timetracking")
-    data = json.loads(data)
-    # logging.debug("Data: %s", str(data))
+    issues = jira.search(query, fields="timetracking", large=True)
+    if issues is None:
+        logging.error("No response for label: %s", label)
+        return None
+    return estimate_issues(issues)
+
+
+def estimate_issues(issues):
+    """
+    Sum original estimates of the issues
+    """
     total = 0
     count = 0
-    if data and "issues" in data:
-        for issue in data["issues"]:
-            # logging.debug(str(issue))
-            if "fields" in issue and "timetracking" in issue["fields"]:
-                # logging.debug(str(issue["fields"]["timetracking"]))
-                timetracking = issue["fields"]["timetracking"]
-                if "originalEstimateSeconds" in timetracking:
-                    seconds = int(timetracking["originalEstimateSeconds"])
-                    hours = seconds / 60 / 60
-                    total += hours
-                    count += 1
+    for issue in issues:
+        # logging.debug(str(issue))
+        if "fields" in issue and "timetracking" in issue["fields"]:
+            # logging.debug(str(issue["fields"]["timetracking"]))
+            timetracking = issue["fields"]["timetracking"]
+            if "originalEstimateSeconds" in timetracking:
+                seconds = int(timetracking["originalEstimateSeconds"])
+                hours = seconds / 60 / 60
+                total += hours
+                count += 1
     if total and count:
         logging.debug("Total: %d hours (%d days) in %d issues", total, total/8, count)
         logging.debug("Average: %.2f hours (%.3f days)", total/count, total/count/8)
@@ -221,6 +402,20 @@ def label_estimates(jira, options, label):
     }
 
 
+def bulk_estimates(jira, query, labels, total=None):
+    """
+    Effort estimates for all labels from one bulk search, None on failure
+    """
+    issues = jira.search(query, fields="labels,timetracking", total=total, large=True)
+    if issues is None:
+        return None
+    by_label = {label: [] for label in labels}
+    for issue in issues:
+        for label in issue_names(issue, "labels") & by_label.keys():
+            by_label[label].append(issue)
+    return {label: estimate_issues(by_label[label]) for label in labels}
+
+
 def all_estimates(jira, options):
     """
     Effort estimates for all labels
@@ -228,13 +423,31 @@ def all_estimates(jira, options):
     section("Effort estimates for labels")
     labels = get_labels(jira, options)
     estimates = {}
+    if not labels:
+        return
+    query = f"project = '{options.project}'"
+    query += f" AND component in ('{options.component}')"
+    query += " AND labels in (%s)" % ", ".join(f"'{label}'" for label in labels)
+    mode, plan = options.stats_mode, None
+    if mode == STATS_AUTO:
+        plan = planner.Planner(jira).plan_estimates("estimates", len(labels), query)
+        mode = plan.strategy
+    with planner.track(jira, plan):
+        results = None
+        if mode == STATS_BULK:
+            results = bulk_estimates(jira, query, labels, plan and plan.total)
+        if results is None:
+            results = {label: label_estimates(jira, options, label) for label in labels}
     for label in labels:
-        estimate = label_estimates(jira, options, label)
-        if estimate["hours"] and estimate["issues"]:
+        estimate = results[label]
+        if estimate is None or (estimate["hours"] and estimate["issues"]):
             estimates[label] = estimate
     logging.info("%20s %10s %21s %21s",
                  "Label", "Issues", "Total(hours, days)", "Average(hours, days)")
     for label in estimates:
+        if estimates[label] is None:
+            logging.info("%20s %10s", label, ERROR)
+            continue
         total = estimates[label]["hours"]
         count = estimates[label]["issues"]
         logging.info("%20s %10d %10d %10d %10.1f %10.1f",
@@ -250,7 +463,7 @@ def test(jira, options):
     jql = f"project = '{options.project}' AND component = '{options.component}'"
     jql += " AND status != 'Closed'"
     section("Test JQL request")
-    echo(jira.jql(jql, max_results=0))
+    echo(jira.jql(jql, max_results=0, fields=""))
     section("Test count function")
     echo(jira.count(jql))
     section("Return all project labels")
@@ -287,7 +500,21 @@ def add_arguments(parser):
                         help=f"Team members (default: {DEFAULT_TEAM})")
     parser.add_argument("--years",
                         default=DEFAULT_YEARS,
+                        type=int,
                         help=f"Max years (default: {DEFAULT_YEARS})")
+    parser.add_argument("--stats-mode",
+                        default=DEFAULT_STATS,
+                        choices=[STATS_AUTO, STATS_COUNT, STATS_GADGET,
+                                 STATS_MATRIX, STATS_BULK],
+                        help="Statistics from cheapest planned strategy, per-year"
+                             " counts, created vs resolved gadget, two-dimensional"
+                             " filter statistics or one bulk search"
+                             f" (default: {DEFAULT_STATS})")
+    parser.add_argument("--allow-filters",
+                        default=False,
+                        action="store_true",
+                        help="let auto statistics mode create a temporary saved filter"
+                             " for two-dimensional filter statistics")
     parser.add_argument("-u", "--username",
                         help="username")
     parser.add_argument("-p", "--password",
@@ -298,6 +525,18 @@ def add_arguments(parser):
                         default=False,
                         action="store_true",
                         help="use token from ~/.netrc")
+    parser.add_argument("--api",
+                        default=API_AUTO,
+                        choices=[API_AUTO, API_CLOUD, API_SERVER],
+                        help=f"Jira REST API flavour (default: {API_AUTO})")
+    parser.add_argument("--workers",
+                        default=WORKERS,
+                        type=int,
+                        help=f"Concurrent requests for large searches (default: {WORKERS})")
+    parser.add_argument("--page-seconds",
+                        default=PAGE_SECONDS,
+                        type=float,
+                        help=f"Target response time per search page (default: {PAGE_SECONDS})")
     parser.add_argument("--jql",
                         help="JQL to run")
     parser.add_argument("-t", "--test",
@@ -307,25 +546,35 @@ def add_arguments(parser):
     return parser
 
 
-def run(options):
+def login(options):
     """
-    Run function
+    Ask for Jira credentials unless token is used
     """
-    if not options.netrc and not options.token:
+    if not options.netrc and not options.token and not recorder.replaying():
         if not options.username:
             options.username = getpass.getuser()
         if not options.password:
             print("Using Jira username:", options.username)
             options.password = getpass.getpass("Enter your Jira password: ")
+
+
+def run(options):
+    """
+    Run function
+    """
+    login(options)
     jira = connect(options)
     if not jira:
         return False
-    if options.test:
-        test(jira, options)
-    else:
-        team_statistics(jira, options)
-        all_estimates(jira, options)
-        all_statistics(jira, options)
+    try:
+        if options.test:
+            test(jira, options)
+        else:
+            team_statistics(jira, options)
+            all_estimates(jira, options)
+            all_statistics(jira, options)
+    finally:
+        jira.close()
     return True
 
 
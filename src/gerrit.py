@@ -3,20 +3,46 @@ Gerrit REST API
 """
 
 import argparse
+import copy
 import datetime
+import http.client
 import json
 import logging
 import netrc
+import os
+import threading
+import time
+import urllib.error
 import urllib.parse
 import urllib.request
 
+import recorder
+import transport
+
 
 DEFAULT_SERVERS = ["https://gerrit.company.com"]  # Replace with your server list
 DEFAULT_TEAM = ["YOUR", "TEAM", "MEMBERS"]  # Replace with your team members
+ERROR = "ERR"  # Shown instead of a value which could not be retrieved
+ACCOUNT_CACHE = os.path.join("~", ".cache", "gojira", "gerrit-accounts.json")
+ACCOUNT_TTL = 30  # Days before cached account ID is resolved again
+PROBE_PATH = "/config/server/version"  # Lightweight request to measure replica latency
+LATENCY_WEIGHT = 0.3  # Weight of the newest sample in moving latency estimate
+REPROBE_INTERVAL = 60  # Seconds before failed replica is probed again
+
+
+def request(url, client=None):
+    """Fetches a URL using credentials found in ~/.netrc using standard libraries.
+    Returns None if the request failed."""
+    content, _, _ = send(url, client)
+    return content
+
 
+def send(url, client=None):
+    """Fetches a URL like request() and returns (content, error, elapsed):
+    content is None and error the exception (if any) when the request failed,
+    elapsed is the recorded response time when replaying."""
 
-def request(url):
-    """Fetches a URL using credentials found in ~/.netrc using standard libraries."""
+    client = client or transport.Transport()
 
     # 1. Extract the hostname from the URL
     parsed_url = urllib.parse.urlparse(url)
@@ -24,7 +50,16 @@ def request(url):
 
     if not host:
         print(f"Error: Could not determine host from URL: {url}")
-        return ""
+        return None, None, 0.0
+
+    # Serve the response from recording without touching network or credentials
+    cassette = recorder.active()
+    if recorder.replaying():
+        content, elapsed, _ = cassette.replay(urllib.request.Request(url))
+        error = None
+        if content is None:
+            error = urllib.error.URLError("no successful recorded response")
+        return content, error, elapsed
 
     # 2. Set up an HTTP password manager that reads from .netrc
     # The HTTPPasswordMgrWithPriorAuth will read the credentials but urllib's
@@ -49,56 +84,232 @@ def request(url):
             auth_handler = urllib.request.HTTPBasicAuthHandler(pass_manager)
 
             # Build the opener with the auth handler
-            opener = urllib.request.build_opener(auth_handler)
-            # Install it globally for subsequent calls (simpler)
-            urllib.request.install_opener(opener)
+            opener = client.build_opener(auth_handler)
 
             # print(f"Using .netrc credentials for host: {host}")
 
         else:
             print(f"Warning: No .netrc entry found for {host}. Attempting request without auth.")
             # If no .netrc entry exists, just use the default opener
-            urllib.request.install_opener(urllib.request.build_opener())
+            opener = client.build_opener()
 
     except FileNotFoundError:
         print(f"Warning: ~/.netrc file not found. Attempting request without auth.")
-        urllib.request.install_opener(urllib.request.build_opener())
+        opener = client.build_opener()
     except Exception as e:
         print(f"Warning: Error reading .netrc file: {e}. Proceeding without explicit auth handler.")
-        urllib.request.install_opener(urllib.request.build_opener())
+        opener = client.build_opener()
 
 
-    # 3. Make the request using the configured opener
+    # 3. Make the request using the configured opener (with timeouts and retries)
+    req = urllib.request.Request(url)
+    content = None
+    headers = None
+    error = None
+    start = time.monotonic()
     try:
-        with urllib.request.urlopen(url) as response:
-            # print(f"\nRequest successful! Status Code: {response.status}")
+        response = client.fetch(opener, req)
+        headers = response.headers
+        # print(f"\nRequest successful! Status Code: {response.status}")
 
-            # Read and decode the response
-            content = response.read().decode("utf-8")
-            # print("Response Snippet:")
-            # print(content[:500] + ("..." if len(content) > 500 else ""))
-            return content
+        # Read and decode the response
+        content = response.body.decode("utf-8")
+        # print("Response Snippet:")
+        # print(content[:500] + ("..." if len(content) > 500 else ""))
 
     except urllib.error.HTTPError as e:
         print(f"\nRequest failed: HTTP Error {e.code} - {e.reason}")
         print(e.read().decode("utf-8")[:200] + "...")
-        return ""
+        error = e
     except urllib.error.URLError as e:
         print(f"\nRequest failed: URL Error {e.reason}")
-        return ""
+        error = e
+    except OSError as e:
+        print(f"\nRequest failed: {e}")
+        error = e
+    except http.client.HTTPException as e:
+        print(f"\nRequest failed: {e!r}")
+        error = e
+    elapsed = time.monotonic() - start
+
+    # 4. Save the request/response pair when recording
+    if cassette:
+        cassette.record(req, content, elapsed, headers)
+    return content, error, elapsed
+
+
+def replica_down(error):
+    """ Return True if the error means the replica is unavailable, not that the query is wrong """
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code >= 500
+    return error is not None
+
+
+class ReplicaSet:
+    """ Replicas of one Gerrit instance: send requests to the fastest healthy one """
+
+    def __init__(self, urls, client=None):
+        self.urls = list(urls)
+        self.client = client or transport.Transport()
+        # Single attempt per replica while another one is left to fail over to
+        self.single = copy.copy(self.client)
+        self.single.retries = 0
+        self.latency = {}  # URL -> moving latency estimate in seconds
+        self.failed = {}  # URL -> time of the last failure
+        self.probed = set()
+        self.lock = threading.Lock()
+
+    def __str__(self):
+        return self.urls[0]
+
+    def observe(self, url, elapsed):
+        """ Update latency estimate, None marks failure """
+        with self.lock:
+            if elapsed is None:
+                self.failed[url] = time.monotonic()
+                logging.warning("Gerrit replica %s failed", url)
+                return
+            self.failed.pop(url, None)
+            previous = self.latency.get(url)
+            if previous is None:
+                self.latency[url] = elapsed
+            else:
+                self.latency[url] = (1 - LATENCY_WEIGHT) * previous + LATENCY_WEIGHT * elapsed
+
+    def fetch(self, url, path, client=None):
+        """ Run request on the replica and update its latency, return (content, error) """
+        content, error, elapsed = send(url + path, client or self.client)
+        if content is not None:
+            self.observe(url, elapsed)
+        elif replica_down(error):
+            self.observe(url, None)
+        return content, error
+
+    def probe(self):
+        """ Measure replicas not probed yet and failed ones due to be checked again """
+        now = time.monotonic()
+        for url in self.urls:
+            failed = self.failed.get(url)
+            if url not in self.probed or (failed and now - failed >= REPROBE_INTERVAL):
+                self.probed.add(url)
+                self.fetch(url, "/a" + PROBE_PATH, self.single)
+        logging.debug("Gerrit replica latency: %s", self.latency)
+
+    def ranked(self):
+        """ Return replicas: healthy ones by latency, then failed ones """
+        if len(self.urls) > 1:
+            self.probe()
+        with self.lock:
+            healthy = [url for url in self.urls if url not in self.failed]
+            failed = [url for url in self.urls if url in self.failed]
+            healthy.sort(key=lambda url: self.latency.get(url, float("inf")))
+            failed.sort(key=lambda url: self.failed[url])
+        return healthy + failed
+
+    def request(self, path):
+        """ Run request on the fastest healthy replica, fail over if the replica is down """
+        ranked = self.ranked()
+        for url in ranked:
+            last = url == ranked[-1]
+            content, error = self.fetch(url, path, self.client if last else self.single)
+            if content is not None or not replica_down(error):
+                return content
+        return None
+
+
+def replica_sets(urls, client=None):
+    """ Return ReplicaSet for every server: a list or comma separated URLs are replicas """
+    servers = []
+    for url in urls:
+        if isinstance(url, str):
+            url = url.split(",")
+        servers.append(ReplicaSet(url, client))
+    return servers
+
+
+def parse(response):
+    """ Return JSON data from Gerrit response without XSSI prefix """
+    if response and response.startswith(")]}'"):
+        return json.loads(response[4:])
+    return None
+
+
+def load_accounts(cache_file):
+    """ Return account cache: {server: {name: {"id": ID, "time": seconds}}} """
+    try:
+        with open(os.path.expanduser(cache_file), "r") as accounts_file:
+            return json.load(accounts_file)
+    except (OSError, ValueError):
+        return {}
 
 
-def get_data(url, name, year):
-    """ """
+def save_accounts(cache_file, accounts):
+    """ Write account cache """
+    path = os.path.expanduser(cache_file)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "w") as accounts_file:
+            json.dump(accounts, accounts_file, indent=2)
+        os.replace(path + ".tmp", path)
+    except OSError as e:
+        logging.warning("Cannot save account cache %s: %s", path, e)
+
+
+def find_account(server, name):
+    """ Return numeric account ID of the exact full name or None if not found or ambiguous """
+    query = urllib.parse.quote(f"name:\"{name}\"")
+    data = parse(server.request(f"/a/accounts/?q={query}&o=DETAILS&n=10"))
+    if data is None:
+        return None
+    matches = [account for account in data if account.get("name") == name]
+    if len(matches) != 1:
+        logging.warning("%d Gerrit accounts match '%s' on %s, using name query",
+                        len(matches), name, server)
+        return None
+    return matches[0]["_account_id"]
+
+
+def resolve_accounts(server, names, cache_file=ACCOUNT_CACHE, ttl=ACCOUNT_TTL):
+    """ Return {name: account ID or None} for the server, using local cache with expiry """
+    if recorder.active():
+        # Lookups must go to the recording, cached IDs would change replayed queries
+        return {name: find_account(server, name) for name in names}
+    accounts = load_accounts(cache_file)
+    cached = accounts.setdefault(str(server), {})
+    now = time.time()
+    resolved = {}
+    changed = False
+    for name in names:
+        entry = cached.get(name)
+        if entry and now - entry["time"] < ttl * 24 * 60 * 60:
+            resolved[name] = entry["id"]
+            continue
+        resolved[name] = find_account(server, name)
+        if resolved[name] is not None:
+            cached[name] = {"id": resolved[name], "time": now}
+            changed = True
+    if changed:
+        save_accounts(cache_file, accounts)
+    logging.debug("Gerrit accounts on %s: %s", server, resolved)
+    return resolved
+
+
+def get_data(server, name, year, account=None):
+    """ Return change counts by status or None if the request failed """
     # --- Example Usage ---
     # Replace with the URL you want to fetch that requires authentication via .netrc
-    gerrit_name = name.replace(" ", "+")
-    target_url = f"{url}/a/changes/?q=after:{year}-01-01+before:{year+1}-01-01+owner:\"{gerrit_name}\""
-    response = request(target_url)
+    if account is not None:
+        owner = str(account)
+    else:
+        owner = "\"" + name.replace(" ", "+") + "\""
+    target_path = f"/a/changes/?q=after:{year}-01-01+before:{year+1}-01-01+owner:{owner}"
+    response = server.request(target_path)
+    if response is None:
+        return None
     commits = {}
     if response:
-        if response.startswith(")]}'"):
-            data = json.loads(response[4:])
+        data = parse(response)
+        if data is not None:
             # print(json.dumps(data, indent=4))
             for commit in data:
                 # print(commit["status"])
@@ -110,31 +321,69 @@ def get_data(url, name, year):
     return commits
 
 
-def collect(url, names, year, none="."):
-    """ """
+def get_statistics(urls, names, year, client=None,
+                   cache_file=ACCOUNT_CACHE, ttl=ACCOUNT_TTL):
+    """ Return change counts by status for every name summed over servers,
+    None for the name if any server failed """
+    servers = replica_sets(urls, client)
+    accounts = [resolve_accounts(server, names, cache_file, ttl) for server in servers]
+    statistics = {}
+    for name in names:
+        statistics[name] = {}
+        for server, server_accounts in zip(servers, accounts):
+            commits = get_data(server, name, year, server_accounts[name])
+            if commits is None:
+                statistics[name] = None
+                break
+            for status, count in commits.items():
+                statistics[name][status] = statistics[name].get(status, 0) + count
+    return statistics
+
+
+def collect(server, names, year, none=".",
+            cache_file=ACCOUNT_CACHE, ttl=ACCOUNT_TTL):
+    """ Print out change statistics for the team """
+    accounts = resolve_accounts(server, names, cache_file, ttl)
     print("Gerrit commit statistics")
-    print("Server:", url)
+    print("Server:", ", ".join(server.urls))
     print("%20s   %5s %5s %5s" % ("Name", "Merged", "New", "Abandoned"))
     for name in names:
-        commits = get_data(url, name, year)
+        commits = get_data(server, name, year, accounts[name])
+        if commits is None:
+            print("%20s   %5s %5s %5s" % (name, ERROR, ERROR, ERROR))
+            continue
         merged = commits["MERGED"] if "MERGED" in commits else none
         new = commits["NEW"] if "NEW" in commits else none
         abandoned = commits["ABANDONED"] if "ABANDONED" in commits else none
         print("%20s   %5s %5s %5s" % (name, merged, new, abandoned))
 
 
+def add_account_arguments(parser):
+    """ Add account cache arguments """
+    parser.add_argument("--account-cache",
+                        default=ACCOUNT_CACHE,
+                        help=f"Gerrit account ID cache file (default: {ACCOUNT_CACHE})")
+    parser.add_argument("--account-ttl",
+                        default=ACCOUNT_TTL,
+                        type=float,
+                        help=f"Days to keep cached account IDs (default: {ACCOUNT_TTL})")
+    return parser
+
+
 def add_arguments(parser):
     """ Parse command line arguments or show help """
     parser.add_argument("--url",
                         nargs="*",
                         type=str,
                         default=DEFAULT_SERVERS,
-                        help=f"Server URLs (default: {DEFAULT_SERVERS})")
+                        help="Server URLs, comma separated URLs are replicas"
+                             f" of one server (default: {DEFAULT_SERVERS})")
     parser.add_argument("--team",
                         nargs="*",
                         type=str,
                         default=DEFAULT_TEAM,
                         help=f"Team members (default: {DEFAULT_TEAM})")
+    add_account_arguments(parser)
     return parser
 
 
@@ -143,8 +392,10 @@ def run(options):
     Run function
     """
     year = datetime.date.today().year
-    for url in options.url:
-        collect(url, options.team, year)
+    client = transport.from_options(options)
+    for server in replica_sets(options.url, client):
+        collect(server, options.team, year,
+                cache_file=options.account_cache, ttl=options.account_ttl)
 
 
 def parse_args():
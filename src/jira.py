@@ -2,13 +2,39 @@
 Jira REST API
 """
 
+import concurrent.futures
+import datetime
+import html
 import json
 import http.cookiejar
 import logging
+import math
 import netrc
+import re
+import threading
 import time
 import urllib
 
+import recorder
+import transport
+
+API_AUTO = "auto"
+API_CLOUD = "cloud"
+API_SERVER = "server"
+PAGE_SIZE = 100  # Initial issues per page when iterating over search results
+MIN_PAGE_SIZE = 10  # Smallest tuned page size
+MAX_PAGE_SIZE = 1000  # Largest tuned page size, servers may cap it lower
+PAGE_SECONDS = 2.0  # Target response time per page
+PAGE_BYTES = 4 * 1024 * 1024  # Maximum preferred response size per page
+MAX_RESULTS = {}  # Base URL -> effective maxResults cap observed on the server
+WORKERS = 4  # Concurrent requests for sharded search
+SHARD_THRESHOLD = 2000  # Search results larger than this are split by created date
+SHARD_PAGES = 3  # Target number of pages per shard
+SHARD_MIN_SPAN = datetime.timedelta(minutes=1)  # JQL date resolution
+JQL_DATE = "%Y/%m/%d %H:%M"
+FILTER_NAME = "gojira temporary filter"  # Prefix of per-run saved filter for matrix statistics
+MATRIX_ROWS = 10000  # Maximum rows returned by two-dimensional statistics
+
 
 def get_list(data, name):
     """
@@ -19,6 +45,28 @@ def get_list(data, name):
     return []
 
 
+def parse_created_vs_resolved(data):
+    """
+    Return {year: {"created": N, "resolved": N}} from created vs resolved
+    gadget response, None if it cannot be parsed
+    """
+    try:
+        rows = get_list(json.loads(data) if data else None, "data")
+    except ValueError:
+        return None
+    series = {}
+    for row in rows:
+        if not isinstance(row, dict):
+            return None
+        period = re.search(r"\d{4}", str(row.get("period", "")))
+        created = row.get("createdValue", row.get("created"))
+        resolved = row.get("resolvedValue", row.get("resolved"))
+        if not period or created is None or resolved is None:
+            return None
+        series[int(period.group())] = {"created": created, "resolved": resolved}
+    return series
+
+
 def get_dict(data, name):
     """
     Helper: return dict by name
@@ -28,6 +76,74 @@ def get_dict(data, name):
     return {}
 
 
+def split_order(query):
+    """
+    Split JQL into condition and ORDER BY clause
+    """
+    match = re.search(r"\s+ORDER\s+BY\s+", query, re.IGNORECASE)
+    if match:
+        return query[:match.start()], query[match.start():]
+    return query, ""
+
+
+def markup_text(markup):
+    """
+    Return plain text of gadget HTML markup
+    """
+    return html.unescape(re.sub(r"<[^>]*>", "", str(markup))).strip()
+
+
+def check_fields(fields):
+    """
+    Require explicit minimal field projection for issue searches
+    """
+    if not fields or "*" in fields:
+        raise ValueError(f"Explicit list of fields is required, got {fields!r}")
+
+
+class PageTuner:
+    """
+    Tune search page size toward target time per page within server cap
+    """
+    def __init__(self, base_url, size=PAGE_SIZE, target=PAGE_SECONDS):
+        self.base_url = base_url
+        self.current = size
+        self.target = target
+        self.lock = threading.Lock()
+
+    def size(self):
+        """
+        Return page size for the next request
+        """
+        with self.lock:
+            return min(self.current, MAX_RESULTS.get(self.base_url, MAX_PAGE_SIZE))
+
+    def observe(self, requested, returned, elapsed, length, last, cap=None):
+        """
+        Update page size from response time and size of the page
+        """
+        with self.lock:
+            if cap is None and not last and 0 < returned < requested:
+                cap = returned
+            if cap is not None and cap < requested:
+                if MAX_RESULTS.get(self.base_url) != cap:
+                    logging.info("Server caps maxResults at %d", cap)
+                MAX_RESULTS[self.base_url] = cap
+                return
+            # Recorded traffic must be replayed with identical page sizes
+            if last or returned < requested or recorder.active():
+                return
+            factor = self.target / max(elapsed, 0.001)
+            if length > PAGE_BYTES:
+                factor = min(factor, PAGE_BYTES / length)
+            factor = min(max(factor, 0.5), 2.0)
+            size = int(min(max(requested * factor, MIN_PAGE_SIZE), MAX_PAGE_SIZE))
+            if size != self.current:
+                logging.debug("Page size %d -> %d (%.2fs, %d bytes)",
+                              self.current, size, elapsed, length)
+            self.current = size
+
+
 def token_from_netrc(url):
     """ Read token from ~/.netrc for the given host """
     host = urllib.parse.urlparse(url).hostname
@@ -50,13 +166,24 @@ class Jira:
     """
     def __init__(self, base_url,
                  username=None, password=None,
-                 token=None, netrc=False):
+                 token=None, netrc=False, client=None, api=API_AUTO,
+                 workers=WORKERS, page_seconds=PAGE_SECONDS):
         self.cookies = http.cookiejar.CookieJar()
-        self.opener = urllib.request.build_opener(
+        self.transport = client or transport.Transport()
+        self.opener = self.transport.build_opener(
             urllib.request.HTTPCookieProcessor(self.cookies))
         self.base_url = base_url
         self.token = token
         self.login_data = None
+        self.api = api
+        self.workers = workers
+        self.pages = PageTuner(base_url, target=page_seconds)
+        self.gadgets = {}  # Gadget name -> False if unavailable on the server
+        self.filter_id = None
+        self.filter_name = f"{FILTER_NAME} {recorder.run_id()[:12]}"
+        self.filter_lock = threading.Lock()
+        self.stats = {"requests": 0, "bytes": 0, "seconds": 0.0}
+        self.stats_lock = threading.Lock()
         if not self.token and netrc:
             self.token = token_from_netrc(base_url)
         if username and password:
@@ -70,23 +197,26 @@ class Jira:
         if self.token:
             logging.info("Using PAT authentication")
             return True
+        if recorder.replaying():
+            logging.info("Replaying recorded session")
+            return True
         session_url = f"{self.base_url}/rest/auth/1/session"
         logging.debug("Session URL:   %s", session_url)
         headers = {"Content-Type": "application/json"}
         req = urllib.request.Request(
             session_url, data=self.login_data, headers=headers)
         try:
-            with self.opener.open(req) as response:
-                response_data = response.read().decode("utf-8")
-                logging.debug("Response:      %s", str(response_data))
-                session_info = json.loads(response_data)
-                if "session" in session_info:
-                    logging.info("Jira session created successfully!")
-                    logging.debug("Session Name:  %s", session_info["session"]["name"])
-                    logging.debug("Session Value: %s", session_info["session"]["value"])
-                    return True
-                logging.error("Failed to create Jira session.")
-                logging.error("Response: %s", response_data)
+            response = self.transport.fetch(self.opener, req)
+            response_data = response.body.decode("utf-8")
+            logging.debug("Response:      %s", str(response_data))
+            session_info = json.loads(response_data)
+            if "session" in session_info:
+                logging.info("Jira session created successfully!")
+                logging.debug("Session Name:  %s", session_info["session"]["name"])
+                logging.debug("Session Value: %s", session_info["session"]["value"])
+                return True
+            logging.error("Failed to create Jira session.")
+            logging.error("Response: %s", response_data)
         except urllib.error.HTTPError as error:
             logging.error("HTTP Error: %s - %s", error.code, error)
             error_response = error.read().decode("utf-8")
@@ -98,27 +228,52 @@ class Jira:
         logging.error("Failed to create Jira session")
         return False
 
-    def request(self, rest):
+    def request(self, rest, data=None, method=None, idempotent=None):
         """
-        Run Jira REST API request
+        Run Jira REST API request, POST (or other method) data as JSON if given,
+        idempotent marks read-only POST requests as safe to retry
+        """
+        body, _ = self.request_status(rest, data, method, idempotent)
+        return body
+
+    def request_status(self, rest, data=None, method=None, idempotent=None):
+        """
+        Run Jira REST API request, return response body (None on failure)
+        and HTTP status (None without response)
         """
         url = f"{self.base_url}/{rest}"
         logging.debug("Request  URL: %s", url)
-        req = urllib.request.Request(url)
+        req = urllib.request.Request(url, method=method)
+        if data is not None:
+            req.data = json.dumps(data).encode("utf-8")
+            req.add_header("Content-Type", "application/json")
         if self.token:
             req.add_header("Authorization", f"Bearer {self.token}")
         logging.debug("Request data: %s", str(req))
+        cassette = recorder.active()
+        if recorder.replaying():
+            # Recorded time keeps planner choices identical to the recording run
+            body, elapsed, status = cassette.replay(req)
+            self.account(body, elapsed)
+            return body, status
+        start = time.monotonic()
+        body = None
+        headers = None
+        status = None
         try:
-            with self.opener.open(req) as response:
-                remaining = response.headers.get("X-RateLimit-Remaining")
-                if remaining is not None and int(remaining) <= 1:
-                    fill_rate = float(response.headers.get("X-RateLimit-FillRate", 2))
-                    interval = float(response.headers.get("X-RateLimit-Interval-Seconds", 1))
-                    delay = interval / fill_rate
-                    logging.debug("Rate limit low (%s remaining), waiting %.1fs", remaining, delay)
-                    time.sleep(delay)
-                return response.read().decode("utf-8")
+            response = self.transport.fetch(self.opener, req, idempotent)
+            headers = response.headers
+            status = response.status
+            remaining = response.headers.get("X-RateLimit-Remaining")
+            if remaining is not None and int(remaining) <= 1:
+                fill_rate = float(response.headers.get("X-RateLimit-FillRate", 2))
+                interval = float(response.headers.get("X-RateLimit-Interval-Seconds", 1))
+                delay = interval / fill_rate
+                logging.debug("Rate limit low (%s remaining), waiting %.1fs", remaining, delay)
+                time.sleep(delay)
+            body = response.body.decode("utf-8")
         except urllib.error.HTTPError as error:
+            status = error.code
             logging.error("HTTP Error during subsequent request: %s - %s",
                           error.code, error.reason)
             error_response = error.read().decode("utf-8")
@@ -127,10 +282,37 @@ class Jira:
             logging.error("URL Error during subsequent request: %s", error.reason)
         except Exception as error:  # pylint: disable=broad-except
             logging.error("An unexpected error occurred during subsequent request: %s", error)
-        return None
+        elapsed = time.monotonic() - start
+        self.account(body, elapsed)
+        if cassette:
+            cassette.record(req, body, elapsed, headers, status)
+        return body, status
 
-    def jql(self, query, start_at=0, max_results=50,
-            fields="summary,status,issuetype,assignee,created"):
+    def account(self, body, elapsed):
+        """
+        Update request statistics: number of requests, received bytes and time
+        """
+        with self.stats_lock:
+            self.stats["requests"] += 1
+            self.stats["bytes"] += len(body) if body else 0
+            self.stats["seconds"] += elapsed
+
+    def is_cloud(self):
+        """
+        Return True for Jira Cloud, detect deployment type on first call
+        """
+        if self.api == API_AUTO:
+            self.api = API_SERVER
+            if urllib.parse.urlparse(self.base_url).hostname.endswith(".atlassian.net"):
+                self.api = API_CLOUD
+            else:
+                data = self.request("rest/api/2/serverInfo")
+                if data and json.loads(data).get("deploymentType") == "Cloud":
+                    self.api = API_CLOUD
+            logging.info("Using Jira %s API", self.api)
+        return self.api == API_CLOUD
+
+    def jql(self, query, start_at=0, max_results=50, *, fields):
         """
         Run Jira JQL request
         """
@@ -144,26 +326,209 @@ class Jira:
         rest = f"rest/api/2/search?{urllib.parse.urlencode(params)}"
         return self.request(rest)
 
+    def search(self, query, fields, page_size=None, total=None, large=False):
+        """
+        Return all issues found by JQL or None on failure,
+        page size is tuned automatically unless given,
+        large results are fetched concurrently in created date shards;
+        total is known from count(), probed first only for likely large searches
+        """
+        if self.workers > 1 and total is None and large:
+            total = self.count(query)
+        if self.workers > 1 and total is not None and total > SHARD_THRESHOLD:
+            return self.search_sharded(query, fields, total, page_size)
+        return self.search_serial(query, fields, page_size)
+
+    def search_server(self, query, fields, page_size=None, limit=None):
+        """
+        Return issues using startAt paged search or None on failure
+        """
+        check_fields(fields)
+        issues = []
+        while True:
+            size = page_size or self.pages.size()
+            start = time.monotonic()
+            response = self.jql(query, start_at=len(issues), max_results=size, fields=fields)
+            if not response:
+                logging.error("No response for query: %s", query)
+                return None
+            elapsed = time.monotonic() - start
+            data = json.loads(response)
+            total = data.get("total", 0)
+            page = get_list(data, "issues")
+            issues.extend(page)
+            last = not page or len(issues) >= total or (limit and len(issues) >= limit)
+            if not page_size:
+                self.pages.observe(size, len(page), elapsed, len(response), last,
+                                   cap=data.get("maxResults"))
+            if last:
+                return issues
+
+    def search_cloud(self, query, fields, page_size=None, limit=None):
+        """
+        Return issues using Jira Cloud token paged search or None on failure
+        """
+        check_fields(fields)
+        issues = []
+        params = {
+            "jql": query,
+            "fields": fields,
+        }
+        while True:
+            size = page_size or self.pages.size()
+            params["maxResults"] = size
+            start = time.monotonic()
+            response = self.request(f"rest/api/3/search/jql?{urllib.parse.urlencode(params)}")
+            if not response:
+                logging.error("No response for query: %s", query)
+                return None
+            elapsed = time.monotonic() - start
+            data = json.loads(response)
+            page = get_list(data, "issues")
+            issues.extend(page)
+            token = data.get("nextPageToken")
+            last = data.get("isLast", True) or not token or (limit and len(issues) >= limit)
+            if not page_size:
+                self.pages.observe(size, len(page), elapsed, len(response), last)
+            if last:
+                return issues
+            params["nextPageToken"] = token
+
+    def search_serial(self, query, fields, page_size=None):
+        """
+        Return all issues without sharding or None on failure
+        """
+        if self.is_cloud():
+            return self.search_cloud(query, fields, page_size)
+        return self.search_server(query, fields, page_size)
+
+    def created_date(self, query, order):
+        """
+        Return created date of the oldest (ASC) or newest (DESC) issue
+        """
+        query = f"{query} ORDER BY created {order}"
+        if self.is_cloud():
+            issues = self.search_cloud(query, "created", page_size=1, limit=1)
+        else:
+            issues = self.search_server(query, "created", page_size=1, limit=1)
+        if not issues:
+            return None
+        created = get_dict(issues[0], "fields").get("created")
+        if not created:
+            return None
+        return datetime.datetime.strptime(created[:10], "%Y-%m-%d")
+
+    def shard_query(self, query, start, end, order=""):
+        """
+        Return JQL restricted to issues created in [start, end)
+        """
+        query = f"({query}) AND created >= '{start:{JQL_DATE}}'"
+        query += f" AND created < '{end:{JQL_DATE}}'"
+        return query + order
+
+    def plan_shards(self, pool, query, start, end, total, size):
+        """
+        Split [start, end) into created ranges of at most size issues each,
+        return list of (start, end) or None on failure
+        """
+        shards = []
+        pending = [(start, end, total)]
+        while pending:
+            ranges = []
+            for low, high, count in pending:
+                parts = math.ceil(count / size)
+                span = max((high - low) / parts, SHARD_MIN_SPAN)
+                span = datetime.timedelta(minutes=math.ceil(span / SHARD_MIN_SPAN))
+                while low < high:
+                    ranges.append((low, min(low + span, high)))
+                    low += span
+            queries = [self.shard_query(query, *bounds) for bounds in ranges]
+            counts = list(pool.map(self.count, queries))
+            pending = []
+            for (low, high), count in zip(ranges, counts):
+                if count is None:
+                    return None
+                if count <= size or high - low <= SHARD_MIN_SPAN:
+                    if count:
+                        shards.append((low, high))
+                else:
+                    pending.append((low, high, count))
+        return sorted(shards)
+
+    def search_sharded(self, query, fields, total, page_size=None):
+        """
+        Return issues fetched concurrently in disjoint created date shards
+        sized from counts to fit a few pages, or None on failure
+        """
+        condition, order = split_order(query)
+        first = self.created_date(condition, "ASC")
+        last = self.created_date(condition, "DESC")
+        if not first or not last:
+            return self.search_serial(query, fields, page_size)
+        # Dates are padded by one day to cover time zone differences
+        start = first - datetime.timedelta(days=1)
+        end = last + datetime.timedelta(days=2)
+        size = (page_size or self.pages.size()) * SHARD_PAGES
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as pool:
+            shards = self.plan_shards(pool, condition, start, end, total, size)
+            if shards is None:
+                return None
+            logging.info("Fetching %d issues in %d shards", total, len(shards))
+            queries = [self.shard_query(condition, *bounds, order) for bounds in shards]
+            results = list(pool.map(
+                lambda shard_query: self.search_serial(shard_query, fields, page_size), queries))
+        if any(issues is None for issues in results):
+            return None
+        issues = []
+        keys = set()
+        for shard in results:
+            for issue in shard:
+                if issue.get("key") not in keys:
+                    keys.add(issue.get("key"))
+                    issues.append(issue)
+        return issues
+
     def count(self, query):
         """
-        Return total from Jira JQL request
+        Return total from Jira JQL request or None on failure
         """
+        if self.is_cloud():
+            return self.count_cloud(query)
         data = self.jql(query, start_at=0, max_results=0, fields="")
         if not data:
             logging.error("No response for query: %s", query)
-            return 0
+            return None
         data = json.loads(data)
         logging.debug("Data: %s", str(data))
         if data and "total" in data:
             return data["total"]
         logging.error("Invalid result: %s", str(data))
-        return 0
+        return None
+
+    def count_cloud(self, query):
+        """
+        Return approximate total from Jira Cloud or None on failure
+        """
+        data = self.request("rest/api/3/search/approximate-count", {"jql": query},
+                            idempotent=True)
+        if not data:
+            logging.error("No response for query: %s", query)
+            return None
+        data = json.loads(data)
+        logging.debug("Data: %s", str(data))
+        if data and "count" in data:
+            return data["count"]
+        logging.error("Invalid result: %s", str(data))
+        return None
 
     def get_project_id(self, project_key):
         """
         Return Jira Project ID by Project key
         """
         data = self.request("rest/api/2/project")
+        if not data:
+            logging.error("Invalid response: %s", str(data))
+            return ""
         data = json.loads(data)
         if data and isinstance(data, list):
             for project in data:
@@ -190,21 +555,116 @@ class Jira:
                 labels.append(label["label"])
         return labels
 
+    def created_vs_resolved(self, query, years):
+        """
+        Return created and resolved counts per year for the last years
+        as {year: {"created": N, "resolved": N}} in one gadget request,
+        or None if the gadget is unavailable
+        """
+        if self.gadgets.get("createdVsResolved") is False:
+            return None
+        today = datetime.date.today()
+        first = datetime.date(today.year - years + 1, 1, 1)
+        params = {
+            "projectOrFilterId": f"jql-{query}",
+            "periodName": "yearly",
+            "daysprevious": (today - first).days + 1,
+            "isCumulative": "false",
+            "showUnresolvedTrend": "false",
+            "versionLabel": "none",
+            "returnData": "true",
+            "width": 400,
+            "height": 250,
+        }
+        data, status = self.request_status(
+            f"rest/gadget/1.0/createdVsResolved/generate?{urllib.parse.urlencode(params)}")
+        if data is None and status != 404:
+            # Transient failure: only this query falls back to counts
+            logging.warning("Created vs resolved gadget request failed, using counts")
+            return None
+        series = parse_created_vs_resolved(data)
+        if not series:
+            logging.warning("Created vs resolved gadget is unavailable, using counts")
+            self.gadgets["createdVsResolved"] = False
+            return None
+        return series
+
+    def temporary_filter(self, query):
+        """
+        Create temporary saved filter unique to this run or update its JQL,
+        return its ID
+        """
+        if self.filter_id is None:
+            data = self.request("rest/api/2/filter", {"name": self.filter_name, "jql": query})
+            if not data:
+                return None
+            self.filter_id = json.loads(data).get("id")
+            logging.debug("Created filter %s: %s", self.filter_id, self.filter_name)
+            return self.filter_id
+        data = self.request(f"rest/api/2/filter/{self.filter_id}",
+                            {"name": self.filter_name, "jql": query}, method="PUT")
+        if not data:
+            return None
+        return self.filter_id
+
+    def close(self):
+        """
+        Remove temporary filter if created
+        """
+        if self.filter_id is not None:
+            self.request(f"rest/api/2/filter/{self.filter_id}", method="DELETE")
+            self.filter_id = None
+
+    def filter_statistics(self, query, ystattype, xstattype="project"):
+        """
+        Return issue counts per ystattype value (e.g. "assignees", "labels")
+        from one two-dimensional filter statistics request as {name: N},
+        or None if the gadget is unavailable
+        """
+        if self.gadgets.get("twodimensionalfilterstats") is False:
+            return None
+        with self.filter_lock:
+            filter_id = self.temporary_filter(query)
+            data = None
+            if filter_id is not None:
+                params = {
+                    "filterId": f"filter-{filter_id}",
+                    "xstattype": xstattype,
+                    "ystattype": ystattype,
+                    "sortDirection": "asc",
+                    "sortBy": "natural",
+                    "numberToShow": MATRIX_ROWS,
+                    "showTotals": "false",
+                }
+                data = self.request("rest/gadget/1.0/twodimensionalfilterstats/generate"
+                                    f"?{urllib.parse.urlencode(params)}")
+        table = get_dict(json.loads(data) if data else None, "table")
+        if "rows" not in table:
+            logging.warning("Two-dimensional filter statistics are unavailable, using counts")
+            self.gadgets["twodimensionalfilterstats"] = False
+            return None
+        rows = {}
+        for row in get_list(table, "rows"):
+            cells = [markup_text(cell.get("markup", "")) for cell in get_list(row, "cells")]
+            if cells:
+                rows[cells[0]] = sum(int(cell) for cell in cells[1:] if cell.isdigit())
+        return rows
+
     def get_component_labels(self, project_key, component):
         """
-        Return list of Labels by Project and Component
+        Return sorted list of Labels by Project and Component,
+        stable order keeps queries built from them reproducible
         """
         query = f"project = '{project_key}'"
         query += f" AND component in ('{component}')"
         query += f" AND labels is not empty"
-        data = self.jql(query, start_at=0, max_results=9999, fields="labels")
-        if not data:
+        issues = self.search(query, fields="labels", large=True)
+        if issues is None:
             logging.error("Invalid response to %s", query)
             return []
-        data = json.loads(data)
         labels = set()
-        for issue in get_list(data, "issues"):
+        for issue in issues:
             fields = get_dict(issue, "fields")
             issue_labels = get_list(fields, "labels")
             labels.update(issue_labels)
-        return list(labels)
+        return sorted(labels)
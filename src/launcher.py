@@ -6,6 +6,10 @@ import logging
 import component
 import config
 import gerrit
+import profiler
+import recorder
+import team
+import transport
 
 
 PROGNAME = "gojira"
@@ -24,8 +28,8 @@ class Launcher:
         self.options = None
         self.command = None
 
-    def common_arguments(self, parser, add_help=False):
-        """ Add common arguments """
+    def common_arguments(self, parser, add_help=False, subcommand=False):
+        """ Add common arguments, accepted both before and after the command """
         group = parser.add_argument_group("global options")
         if add_help:
             group.add_argument(
@@ -41,12 +45,19 @@ class Launcher:
             "--config",
             default=CONFIG_FILE,
             help=f"config file (default: {CONFIG_FILE})")
+        transport.add_arguments(group)
+        recorder.add_arguments(group)
+        profiler.add_arguments(group)
         group.add_argument(
             "--log-format",
             default=f"[{PROGNAME}] %(levelname)5s: %(message)s",
             help=argparse.SUPPRESS)
+        if subcommand:
+            # Defaults of the command copies would overwrite values given before the command
+            for action in group._group_actions:  # pylint: disable=protected-access
+                action.default = argparse.SUPPRESS
 
-    def parse_arguments(self):
+    def parse_arguments(self, argv=None):
         """ Parse command line arguments or show help """
         parser = argparse.ArgumentParser(
             formatter_class=argparse.RawTextHelpFormatter,
@@ -63,18 +74,25 @@ class Launcher:
             "gerrit",
             help="Run Gerrit statistics")
         gerrit.add_arguments(parser_gerrit)
-        self.common_arguments(parser_gerrit)
+        self.common_arguments(parser_gerrit, subcommand=True)
 
         # Argument parser for Jira
         parser_jira = subparsers.add_parser(
             "jira",
             help="Run Jira statistics")
         component.add_arguments(parser_jira)
-        self.common_arguments(parser_jira)
+        self.common_arguments(parser_jira, subcommand=True)
+
+        # Argument parser for combined Jira and Gerrit report
+        parser_all = subparsers.add_parser(
+            "all",
+            help="Run Jira and Gerrit team statistics concurrently")
+        team.add_arguments(parser_all)
+        self.common_arguments(parser_all, subcommand=True)
 
         self.common_arguments(parser, add_help=True)
 
-        self.options = parser.parse_args()
+        self.options = parser.parse_args(argv)
         self.command = self.options.command
         if self.options.verbosity >= 2:
             log_level = logging.DEBUG
@@ -97,7 +115,10 @@ class Launcher:
             if self.command == "gerrit" and "gerrit" in config_data:
                 if "url" in config_data["gerrit"]:
                     self.options.url = config_data["gerrit"]["url"]
-            if self.command == "jira" and "jira" in config_data:
+            if self.command == "all" and "gerrit" in config_data:
+                if "url" in config_data["gerrit"]:
+                    self.options.gerrit_url = config_data["gerrit"]["url"]
+            if self.command in ("jira", "all") and "jira" in config_data:
                 if "url" in config_data["jira"]:
                     self.options.url = config_data["jira"]["url"]
                 if "project" in config_data["jira"]:
@@ -106,18 +127,28 @@ class Launcher:
                     self.options.component = config_data["jira"]["component"]
                 if "prefix" in config_data["jira"]:
                     self.options.prefix = config_data["jira"]["prefix"]
+                if "api" in config_data["jira"]:
+                    self.options.api = config_data["jira"]["api"]
             logging.debug("Updated: %s", self.options)
 
 
-    def run(self):
-        """ Parse arguments and run the command """
-        self.parse_arguments()
+    def execute(self):
+        """ Run the selected command """
         if self.command == "gerrit":
             logging.info("Running Gerrit statistics...")
             gerrit.run(self.options)
         elif self.command == "jira":
             logging.info("Running Jira statistics...")
             component.run(self.options)
+        elif self.command == "all":
+            logging.info("Running Jira and Gerrit statistics...")
+            team.run(self.options)
         else:
             logging.error("Unrecognized command: %s", self.command)
+
+    def run(self):
+        """ Parse arguments and run the command """
+        self.parse_arguments()
+        recorder.configure(self.options)
+        profiler.run(self.options, self.execute)
         return 0
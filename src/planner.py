@@ -0,0 +1,144 @@
+"""
+Cost-based planner choosing how to build Jira statistics tables
+"""
+
+import collections
+import contextlib
+import logging
+import math
+import time
+
+import jira as jira_api
+
+
+COUNT = "count"  # One request per table cell
+GADGET = "gadget"  # One created vs resolved gadget request per row
+MATRIX = "matrix"  # Two-dimensional filter statistics requests per year
+BULK = "bulk"  # Fetch all issues once and aggregate locally
+
+COUNT_BYTES = 200  # Typical size of count response
+ISSUE_BYTES = 600  # Typical size of one issue with few fields
+GADGET_BYTES = 2000  # Typical size of created vs resolved response
+ROW_BYTES = 300  # Typical size of one row in filter statistics response
+BANDWIDTH = 1000000  # Assumed download speed in bytes per second
+MIN_LATENCY = 0.001  # Lower bound of request latency in seconds
+
+# Total is the probed number of issues for bulk fetch, if known
+Plan = collections.namedtuple("Plan", "table strategy requests bytes seconds total",
+                              defaults=(None,))
+
+
+class Planner:
+    """
+    Probe result sizes with cheap totals and pick the cheapest strategy,
+    strategies creating saved filters on the server only if allowed
+    """
+    def __init__(self, jira, filters=False):
+        self.jira = jira
+        self.filters = filters
+        self.latency = None
+
+    def probe(self, query):
+        """
+        Return total for the query and update measured request latency
+        """
+        before = dict(self.jira.stats)
+        total = self.jira.count(query)
+        requests = self.jira.stats["requests"] - before["requests"]
+        if requests:
+            latency = (self.jira.stats["seconds"] - before["seconds"]) / requests
+            self.latency = max(latency, MIN_LATENCY)
+        return total
+
+    def plan(self, table, strategy, requests, size, parallel=1, total=None):
+        """
+        Return plan with estimated time for given requests and bytes
+        """
+        latency = self.latency or MIN_LATENCY
+        seconds = requests * latency / parallel + size / BANDWIDTH
+        return Plan(table, strategy, requests, size, seconds, total)
+
+    def bulk(self, table, total):
+        """
+        Return plan for fetching all issues page by page
+        """
+        page_size = self.jira.pages.size()
+        pages = max(1, math.ceil(total / page_size))
+        if total > jira_api.SHARD_THRESHOLD and self.jira.workers > 1:
+            # Every shard is counted and ends with a partial page,
+            # plus two created date lookups
+            shards = math.ceil(total / (page_size * jira_api.SHARD_PAGES))
+            return self.plan(table, BULK, pages + shards * 2 + 2, total * ISSUE_BYTES,
+                             parallel=self.jira.workers, total=total)
+        return self.plan(table, BULK, pages, total * ISSUE_BYTES, total=total)
+
+    def gadgets_allowed(self, name):
+        """
+        Return True if gadget may be used on this server
+        """
+        return not self.jira.is_cloud() and self.jira.gadgets.get(name) is not False
+
+    def choose(self, plans):
+        """
+        Return the cheapest plan and log all candidates
+        """
+        best = min(plans, key=lambda plan: plan.seconds)
+        for plan in plans:
+            logging.debug("Plan for %s: %s", plan.table, describe(plan))
+        logging.info("Chosen plan for %s: %s", best.table, describe(best))
+        return best
+
+    def plan_statistics(self, table, rows, years, bulk_query):
+        """
+        Choose strategy for created/resolved table with rows x years cells
+        """
+        total = self.probe(bulk_query)
+        plans = [self.plan(table, COUNT, rows * years * 2, rows * years * 2 * COUNT_BYTES)]
+        if total is not None:
+            plans.append(self.bulk(table, total))
+        if self.gadgets_allowed("createdVsResolved"):
+            plans.append(self.plan(table, GADGET, rows, rows * GADGET_BYTES))
+        if self.filters and self.gadgets_allowed("twodimensionalfilterstats"):
+            plans.append(self.plan(table, MATRIX, years * 4 + 2,
+                                   years * 2 * rows * ROW_BYTES))
+        return self.choose(plans)
+
+    def plan_estimates(self, table, rows, bulk_query):
+        """
+        Choose strategy for per-label estimates: search per label or bulk
+        """
+        total = self.probe(bulk_query)
+        if total is None:
+            return self.plan(table, COUNT, rows, rows * ISSUE_BYTES)
+        pages = rows + math.ceil(total / self.jira.pages.size())
+        return self.choose([
+            self.plan(table, COUNT, pages, total * ISSUE_BYTES),
+            self.bulk(table, total),
+        ])
+
+
+def describe(plan):
+    """
+    Return human readable plan cost
+    """
+    return (f"{plan.strategy} ({plan.requests} requests, "
+            f"{plan.bytes // 1024} KB, {plan.seconds:.1f}s)")
+
+
+@contextlib.contextmanager
+def track(jira, plan):
+    """
+    Log predicted versus actual cost of the plan executed in the block
+    """
+    if plan is None:
+        yield
+        return
+    before = dict(jira.stats)
+    start = time.monotonic()
+    yield
+    actual = Plan(plan.table, plan.strategy,
+                  jira.stats["requests"] - before["requests"],
+                  jira.stats["bytes"] - before["bytes"],
+                  time.monotonic() - start)
+    logging.info("Plan for %s predicted %s, actual %s",
+                 plan.table, describe(plan), describe(actual))
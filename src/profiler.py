@@ -0,0 +1,169 @@
+"""
+CPU and memory profiling of a command
+"""
+
+import cProfile
+import logging
+import pstats
+import sys
+import threading
+import tracemalloc
+
+
+PROFILE_CPU = "cpu"
+PROFILE_MEM = "mem"
+DEFAULT_OUTPUT = {
+    PROFILE_CPU: "gojira.pstats",
+    PROFILE_MEM: "gojira.snapshot",
+}
+DEFAULT_TOP = 20  # Number of hotspots to print
+SAMPLE_INTERVAL = 0.2  # Seconds between memory peak checks
+TRACE_FRAMES = 10  # Frames kept per allocation traceback
+
+
+class ThreadProfiles:
+    """
+    Profile every thread started while installed with its own cProfile
+    """
+    def __init__(self):
+        self.profiles = []
+        self.lock = threading.Lock()
+
+    def hook(self, *_):
+        """
+        First profile event in a new thread: replace hook with cProfile
+        """
+        sys.setprofile(None)
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+ profiler already sees all threads
+            return
+        with self.lock:
+            self.profiles.append(profile)
+
+    def __enter__(self):
+        threading.setprofile(self.hook)
+        return self
+
+    def __exit__(self, *_):
+        threading.setprofile(None)
+        for profile in self.profiles:
+            profile.create_stats()
+
+
+def profile_cpu(function, output, top):
+    """
+    Run function under cProfile including worker threads,
+    save merged pstats file and print hotspots
+    """
+    profile = cProfile.Profile()
+    threads = ThreadProfiles()
+    try:
+        with threads:
+            return profile.runcall(function)
+    finally:
+        stats = pstats.Stats(profile, *threads.profiles, stream=sys.stderr)
+        stats.dump_stats(output)
+        print(f"CPU profile of {len(threads.profiles) + 1} threads saved to {output}",
+              file=sys.stderr)
+        stats.sort_stats(pstats.SortKey.TIME).print_stats(top)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(top)
+
+
+class PeakSampler(threading.Thread):
+    """
+    Take tracemalloc snapshot whenever sampled traced memory reaches a new
+    peak, the true peak between samples may be higher
+    """
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.peak = 0
+        self.snapshot = None
+
+    def sample(self):
+        """
+        Keep snapshot if current memory is the highest seen so far
+        """
+        current, _ = tracemalloc.get_traced_memory()
+        if current > self.peak:
+            self.peak = current
+            self.snapshot = tracemalloc.take_snapshot()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def stop(self):
+        """
+        Stop sampling and take the final sample
+        """
+        self.stopped.set()
+        self.join()
+        self.sample()
+
+
+def profile_mem(function, output, top):
+    """
+    Run function under tracemalloc, save snapshot of the approximate peak
+    and print allocation sites
+    """
+    tracemalloc.start(TRACE_FRAMES)
+    sampler = PeakSampler()
+    sampler.start()
+    try:
+        return function()
+    finally:
+        sampler.stop()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        snapshot = sampler.snapshot
+        print(f"Peak traced memory: {peak / 1024 / 1024:.1f} MiB", file=sys.stderr)
+        if snapshot is None:
+            print("No memory snapshot was taken", file=sys.stderr)
+        else:
+            snapshot.dump(output)
+            print(f"Memory snapshot saved to {output}", file=sys.stderr)
+            print(f"Top {top} allocation sites at approximate peak "
+                  f"({sampler.peak / 1024 / 1024:.1f} MiB, sampled every "
+                  f"{sampler.interval}s):", file=sys.stderr)
+            for stat in snapshot.statistics("lineno")[:top]:
+                print(f"  {stat}", file=sys.stderr)
+
+
+def run(options, function):
+    """
+    Run function with profiling selected in options
+    """
+    kind = getattr(options, "profile", None)
+    if not kind:
+        return function()
+    output = getattr(options, "profile_output", None) or DEFAULT_OUTPUT[kind]
+    top = getattr(options, "profile_top", DEFAULT_TOP)
+    logging.info("Profiling %s usage", kind)
+    if kind == PROFILE_CPU:
+        return profile_cpu(function, output, top)
+    return profile_mem(function, output, top)
+
+
+def add_arguments(parser):
+    """ Add profiling arguments """
+    parser.add_argument(
+        "--profile",
+        choices=[PROFILE_CPU, PROFILE_MEM],
+        help="profile CPU (cProfile) or memory (tracemalloc) usage")
+    parser.add_argument(
+        "--profile-output",
+        metavar="FILE",
+        help=f"profile output file (default: {DEFAULT_OUTPUT[PROFILE_CPU]}"
+             f" or {DEFAULT_OUTPUT[PROFILE_MEM]})")
+    parser.add_argument(
+        "--profile-top",
+        default=DEFAULT_TOP,
+        type=int,
+        metavar="N",
+        help=f"number of hotspots to print (default: {DEFAULT_TOP})")
+    return parser
@@ -0,0 +1,170 @@
+"""
+HTTP record/replay for deterministic offline runs
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+
+RUN_ID_FILE = "run-id"  # Identifies the recorded run, e.g. in names of temporary objects
+SCRUBBED = "***"
+SECRET_HEADERS = ("authorization", "cookie", "set-cookie", "proxy-authorization")
+
+
+def scrub(headers):
+    """
+    Return headers as dict with credentials removed
+    """
+    if not headers:
+        return {}
+    return {
+        name: SCRUBBED if name.lower() in SECRET_HEADERS else value
+        for name, value in headers.items()
+    }
+
+
+def request_key(req):
+    """
+    Return stable key of the request: method, URL and body
+    """
+    digest = hashlib.sha256()
+    digest.update(req.get_method().encode("utf-8"))
+    digest.update(b"\0" + req.full_url.encode("utf-8") + b"\0")
+    digest.update(req.data or b"")
+    return digest.hexdigest()
+
+
+class Recorder:
+    """
+    Store request/response pairs in a directory or serve them back
+    """
+    def __init__(self, directory, replaying=False, latency=False):
+        self.directory = directory
+        self.replaying = replaying
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.run_id = uuid.uuid4().hex
+        run_id_path = os.path.join(directory, RUN_ID_FILE)
+        if replaying:
+            if os.path.exists(run_id_path):
+                with open(run_id_path, "r") as run_id_file:
+                    self.run_id = run_id_file.read().strip()
+        else:
+            os.makedirs(directory, exist_ok=True)
+            with open(run_id_path, "w") as run_id_file:
+                run_id_file.write(self.run_id)
+
+    def path(self, req):
+        """
+        Return file name of the recorded request
+        """
+        return os.path.join(self.directory, request_key(req) + ".json")
+
+    def record(self, req, body, elapsed=0.0, headers=None, status=None):
+        """
+        Save response body (None for failed request) and HTTP status
+        (None without response) with scrubbed headers
+        """
+        entry = {
+            "method": req.get_method(),
+            "url": req.full_url,
+            "request": req.data.decode("utf-8") if req.data else None,
+            "headers": scrub(dict(req.header_items())),
+            "response": body,
+            "status": status,
+            "response_headers": scrub(headers),
+            "elapsed": elapsed,
+        }
+        path = self.path(req)
+        with self.lock:
+            with open(path + ".tmp", "w") as record_file:
+                json.dump(entry, record_file, indent=2)
+            os.replace(path + ".tmp", path)
+        logging.debug("Recorded %s %s", entry["method"], entry["url"])
+
+    def replay(self, req):
+        """
+        Return recorded response body (None if it failed or was not recorded),
+        response time and HTTP status, so timing and error based decisions
+        match the recording
+        """
+        path = self.path(req)
+        if not os.path.exists(path):
+            logging.error("No recorded response for %s %s", req.get_method(), req.full_url)
+            return None, 0.0, None
+        with open(path, "r") as record_file:
+            entry = json.load(record_file)
+        logging.debug("Replaying %s %s", entry["method"], entry["url"])
+        elapsed = entry.get("elapsed") or 0.0
+        if self.latency and elapsed:
+            time.sleep(elapsed)
+        return entry["response"], elapsed, entry.get("status")
+
+
+_RECORDER = None
+
+
+def active():
+    """
+    Return active recorder or None
+    """
+    return _RECORDER
+
+
+def replaying():
+    """
+    Return True if responses are served from recording
+    """
+    return _RECORDER is not None and _RECORDER.replaying
+
+
+def run_id():
+    """
+    Return ID unique for this run, the recorded one when replaying
+    """
+    if _RECORDER is not None:
+        return _RECORDER.run_id
+    return uuid.uuid4().hex
+
+
+def configure(options):
+    """
+    Activate recording or replaying from command line options
+    """
+    global _RECORDER  # pylint: disable=global-statement
+    record = getattr(options, "record", None)
+    replay = getattr(options, "replay", None)
+    if replay:
+        logging.info("Replaying HTTP traffic from %s", replay)
+        _RECORDER = Recorder(replay, replaying=True,
+                             latency=getattr(options, "replay_latency", False))
+    elif record:
+        logging.info("Recording HTTP traffic to %s", record)
+        _RECORDER = Recorder(record)
+    else:
+        _RECORDER = None
+    return _RECORDER
+
+
+def add_arguments(parser):
+    """ Add record/replay arguments """
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument(
+        "--record",
+        metavar="DIR",
+        help="record HTTP requests and responses to DIR")
+    group.add_argument(
+        "--replay",
+        metavar="DIR",
+        help="replay HTTP responses from DIR instead of network")
+    parser.add_argument(
+        "--replay-latency",
+        default=False,
+        action="store_true",
+        help="wait recorded response time when replaying")
+    return parser
@@ -0,0 +1,73 @@
+"""
+Combined Jira and Gerrit statistics for the team
+"""
+
+import concurrent.futures
+import datetime
+import logging
+
+import component
+import gerrit
+import transport
+
+
+def report(jira_statistics, gerrit_statistics, none="."):
+    """
+    Print out one line per person: Jira created/resolved and Gerrit changes
+    """
+    years = ""
+    for data in next(iter(jira_statistics.values()), []):
+        years += "%10s" % data["year"]
+    print("Team statistics (Jira created/resolved, Gerrit changes this year)")
+    print("%20s %s   %6s %5s %9s" % ("Name", years, "Merged", "New", "Abandoned"))
+    for name in jira_statistics:
+        line = "%20s " % name
+        for data in jira_statistics[name]:
+            line += "%10s" % component.cell(data["created"], data["resolved"])
+        commits = gerrit_statistics.get(name)
+        if commits is None:
+            line += "   %6s %5s %9s" % (gerrit.ERROR, gerrit.ERROR, gerrit.ERROR)
+        else:
+            line += "   %6s %5s %9s" % (commits.get("MERGED", none),
+                                        commits.get("NEW", none),
+                                        commits.get("ABANDONED", none))
+        print(line)
+
+
+def add_arguments(parser):
+    """ Parse command line arguments or show help """
+    component.add_arguments(parser)
+    parser.add_argument("--gerrit-url",
+                        nargs="*",
+                        type=str,
+                        default=gerrit.DEFAULT_SERVERS,
+                        help="Gerrit server URLs, comma separated URLs are replicas"
+                             f" of one server (default: {gerrit.DEFAULT_SERVERS})")
+    gerrit.add_account_arguments(parser)
+    return parser
+
+
+def run(options):
+    """
+    Run Jira and Gerrit collection concurrently and print merged report
+    """
+    component.login(options)
+    jira = component.connect(options)
+    if not jira:
+        return False
+    year = datetime.date.today().year
+    client = transport.from_options(options)
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=2) as pool:
+            jira_future = pool.submit(component.collect_team, jira, options)
+            gerrit_future = pool.submit(
+                gerrit.get_statistics, options.gerrit_url, options.team, year, client,
+                options.account_cache, options.account_ttl)
+            jira_statistics = jira_future.result()
+            gerrit_statistics = gerrit_future.result()
+    finally:
+        jira.close()
+    logging.debug("Jira: %s", jira_statistics)
+    logging.debug("Gerrit: %s", gerrit_statistics)
+    report(jira_statistics, gerrit_statistics)
+    return True
@@ -0,0 +1,342 @@
+"""
+HTTP transport: timeouts, retries with jitter, hedging and circuit breaker
+"""
+
+import collections
+import concurrent.futures
+import functools
+import http.client
+import logging
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+
+CONNECT_TIMEOUT = 10.0  # Seconds to establish connection (incl. TLS handshake)
+READ_TIMEOUT = 60.0  # Seconds to wait for every read from established socket
+RETRIES = 3  # Additional attempts after the first failure
+BACKOFF = 0.5  # Base delay for exponential backoff in seconds
+MAX_BACKOFF = 30.0  # Upper limit for a single backoff delay in seconds
+BREAKER_THRESHOLD = 5  # Consecutive failures before the circuit opens
+BREAKER_COOLDOWN = 30.0  # Seconds the circuit stays open before a trial request
+
+RETRY_STATUS = (429, 500, 502, 503, 504)
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS")  # Safe to repeat or duplicate
+
+Response = collections.namedtuple("Response", "status headers body elapsed")
+
+
+class CircuitOpenError(urllib.error.URLError):
+    """
+    Raised without touching the network while the host circuit is open
+    """
+
+
+class CircuitBreaker:
+    """
+    Per-host circuit breaker: closed -> open -> half-open -> closed
+    """
+    def __init__(self, host, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.host = host
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+        self.lock = threading.Lock()
+
+    def allow(self):
+        """
+        Return True if a request to the host may be sent now
+        """
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if self.trial:
+                return False
+            if time.monotonic() - self.opened_at >= self.cooldown:
+                logging.info("Circuit for %s is half-open, sending trial request", self.host)
+                self.trial = True
+                return True
+            return False
+
+    def success(self):
+        """
+        Record successful request
+        """
+        with self.lock:
+            if self.opened_at is not None:
+                logging.info("Circuit for %s is closed", self.host)
+            self.failures = 0
+            self.opened_at = None
+            self.trial = False
+
+    def failure(self):
+        """
+        Record failed request
+        """
+        with self.lock:
+            self.failures += 1
+            if self.trial or self.failures >= self.threshold:
+                if self.opened_at is None or self.trial:
+                    logging.warning("Circuit for %s is open after %d failures",
+                                    self.host, self.failures)
+                self.opened_at = time.monotonic()
+                self.trial = False
+
+    def is_open(self):
+        """
+        Return True if requests to the host are currently rejected
+        """
+        with self.lock:
+            return self.opened_at is not None
+
+
+_BREAKERS = {}
+_BREAKERS_LOCK = threading.Lock()
+
+
+def get_breaker(host, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+    """
+    Return circuit breaker shared by all transports for the given host
+    """
+    with _BREAKERS_LOCK:
+        if host not in _BREAKERS:
+            _BREAKERS[host] = CircuitBreaker(host, threshold, cooldown)
+        return _BREAKERS[host]
+
+
+class _ReadTimeoutMixin:
+    """
+    Switch socket to read timeout once connection is established
+    """
+    def __init__(self, *args, read_timeout=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.read_timeout = read_timeout
+
+    def connect(self):
+        super().connect()
+        if self.read_timeout is not None:
+            self.sock.settimeout(self.read_timeout)
+
+
+class _HTTPConnection(_ReadTimeoutMixin, http.client.HTTPConnection):
+    pass
+
+
+class _HTTPSConnection(_ReadTimeoutMixin, http.client.HTTPSConnection):
+    pass
+
+
+class TimeoutHTTPHandler(urllib.request.HTTPHandler):
+    """
+    HTTP handler with separate read timeout
+    """
+    def __init__(self, read_timeout=READ_TIMEOUT):
+        super().__init__()
+        self.read_timeout = read_timeout
+
+    def http_open(self, req):
+        return self.do_open(
+            functools.partial(_HTTPConnection, read_timeout=self.read_timeout), req)
+
+
+class TimeoutHTTPSHandler(urllib.request.HTTPSHandler):
+    """
+    HTTPS handler with separate read timeout
+    """
+    def __init__(self, read_timeout=READ_TIMEOUT):
+        super().__init__()
+        self.read_timeout = read_timeout
+
+    def https_open(self, req):
+        return self.do_open(
+            functools.partial(_HTTPSConnection, read_timeout=self.read_timeout), req,
+            context=self._context)
+
+
+def retry_after(error):
+    """
+    Return Retry-After delay in seconds from HTTP error or None
+    """
+    headers = getattr(error, "headers", None)
+    value = headers.get("Retry-After") if headers else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def is_retryable(error):
+    """
+    Return True if the request may succeed when repeated
+    """
+    if isinstance(error, CircuitOpenError):
+        return False
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code in RETRY_STATUS
+    return isinstance(error, (urllib.error.URLError, OSError, http.client.HTTPException))
+
+
+class Transport:
+    """
+    Send requests with timeouts, bounded retries, optional hedging
+    and per-host circuit breaker
+    """
+    def __init__(self,
+                 connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT,
+                 retries=RETRIES, backoff=BACKOFF, max_backoff=MAX_BACKOFF,
+                 hedge=None,
+                 breaker_threshold=BREAKER_THRESHOLD, breaker_cooldown=BREAKER_COOLDOWN):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge = hedge
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+
+    def build_opener(self, *handlers):
+        """
+        Return URL opener honouring the read timeout
+        """
+        return urllib.request.build_opener(
+            TimeoutHTTPHandler(self.read_timeout),
+            TimeoutHTTPSHandler(self.read_timeout),
+            *handlers)
+
+    def delay(self, attempt, error=None):
+        """
+        Return exponential backoff delay with full jitter
+        """
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        after = retry_after(error)
+        if after is not None:
+            delay = max(delay, min(after, self.max_backoff))
+        return delay
+
+    def send(self, opener, req):
+        """
+        Send single request and read whole response
+        """
+        start = time.monotonic()
+        with opener.open(req, timeout=self.connect_timeout) as response:
+            body = response.read()
+            return Response(response.status, response.headers, body,
+                            time.monotonic() - start)
+
+    def send_hedged(self, opener, req):
+        """
+        Send request and, if it is slow, a duplicate one; return the first success
+        """
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+        try:
+            futures = [pool.submit(self.send, opener, req)]
+            done, _ = concurrent.futures.wait(futures, timeout=self.hedge)
+            if not done:
+                logging.debug("Hedging slow request: %s", req.full_url)
+                futures.append(pool.submit(self.send, opener, req))
+            failure = None
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    return future.result()
+                except Exception as error:  # pylint: disable=broad-except
+                    failure = failure or error
+            raise failure
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def fetch(self, opener, req, idempotent=None):
+        """
+        Send request with retries of idempotent methods (or requests marked
+        idempotent, e.g. read-only POST); raise the last error when all attempts fail
+        """
+        host = urllib.parse.urlparse(req.full_url).hostname
+        breaker = get_breaker(host, self.breaker_threshold, self.breaker_cooldown)
+        if idempotent is None:
+            idempotent = req.get_method() in IDEMPOTENT_METHODS
+        hedge = self.hedge and idempotent
+        attempt = 0
+        while True:
+            if not breaker.allow():
+                raise CircuitOpenError(f"circuit open for {host}")
+            try:
+                if hedge:
+                    response = self.send_hedged(opener, req)
+                else:
+                    response = self.send(opener, req)
+                breaker.success()
+                return response
+            except Exception as error:  # pylint: disable=broad-except
+                if not is_retryable(error):
+                    # Host answered an HTTP error; anything else must not
+                    # leave a half-open trial pending forever
+                    if isinstance(error, urllib.error.HTTPError):
+                        breaker.success()
+                    else:
+                        breaker.failure()
+                    raise
+                breaker.failure()
+                # Failed POST may have been completed by the server
+                if not idempotent or attempt >= self.retries:
+                    raise
+                delay = self.delay(attempt, error)
+                attempt += 1
+                logging.warning("Request to %s failed (%s), retry %d/%d in %.1fs",
+                                host, error, attempt, self.retries, delay)
+                if isinstance(error, urllib.error.HTTPError):
+                    error.close()
+                time.sleep(delay)
+
+
+def add_arguments(parser):
+    """ Add transport arguments """
+    parser.add_argument(
+        "--connect-timeout",
+        default=CONNECT_TIMEOUT,
+        type=float,
+        help=f"connection timeout in seconds (default: {CONNECT_TIMEOUT})")
+    parser.add_argument(
+        "--read-timeout",
+        default=READ_TIMEOUT,
+        type=float,
+        help=f"read timeout in seconds (default: {READ_TIMEOUT})")
+    parser.add_argument(
+        "--retries",
+        default=RETRIES,
+        type=int,
+        help=f"retries for failed requests (default: {RETRIES})")
+    parser.add_argument(
+        "--hedge",
+        default=None,
+        type=float,
+        metavar="SECONDS",
+        help="send duplicate GET request if no response after SECONDS")
+    parser.add_argument(
+        "--breaker-threshold",
+        default=BREAKER_THRESHOLD,
+        type=int,
+        help=f"failures before failing fast for a host (default: {BREAKER_THRESHOLD})")
+    parser.add_argument(
+        "--breaker-cooldown",
+        default=BREAKER_COOLDOWN,
+        type=float,
+        help=f"seconds to fail fast before next trial (default: {BREAKER_COOLDOWN})")
+    return parser
+
+
+def from_options(options):
+    """
+    Return transport configured from command line options
+    """
+    return Transport(
+        connect_timeout=getattr(options, "connect_timeout", CONNECT_TIMEOUT),
+        read_timeout=getattr(options, "read_timeout", READ_TIMEOUT),
+        retries=getattr(options, "retries", RETRIES),
+        hedge=getattr(options, "hedge", None),
+        breaker_threshold=getattr(options, "breaker_threshold", BREAKER_THRESHOLD),
+        breaker_cooldown=getattr(options, "breaker_cooldown", BREAKER_COOLDOWN))
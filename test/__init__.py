@@ -0,0 +1,8 @@
+"""
+Unit tests, modules under test are imported from src
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
@@ -0,0 +1,81 @@
+"""
+Tests for Jira component statistics
+"""
+
+import argparse
+import datetime
+import unittest
+
+import component
+
+
+class BulkJira:
+    """
+    Jira returning fixed issues from bulk search without network
+    """
+    def __init__(self, issues):
+        self.issues = issues
+        self.searches = []
+
+    def search(self, query, fields, page_size=None, total=None, large=False):
+        self.searches.append((query, fields, total, large))
+        return self.issues
+
+
+def issue(created, resolved=None, labels=(), assignee=None):
+    return {"fields": {
+        "created": created,
+        "resolutiondate": resolved,
+        "labels": list(labels),
+        "assignee": assignee,
+    }}
+
+
+class BulkStatisticsTest(unittest.TestCase):
+    """
+    Created and resolved counts per name and year from one bulk search
+    """
+    year = datetime.date.today().year
+    options = argparse.Namespace(years=2)
+
+    def test_labels_by_year(self):
+        this, last, old = (f"{year}-03-01T10:00:00.000+0000"
+                           for year in (self.year, self.year - 1, self.year - 5))
+        client = BulkJira([
+            issue(this, labels=["a", "b"]),
+            issue(last, this, labels=["a"]),
+            issue(old, last, labels=["a", "other"]),
+            issue(old, old, labels=["b"]),
+        ])
+        statistics = component.bulk_statistics(client, self.options, "q", "labels",
+                                               ["a", "b", "c"], total=4)
+        self.assertEqual(statistics, {
+            "a": [{"year": self.year, "created": 1, "resolved": 1},
+                  {"year": self.year - 1, "created": 1, "resolved": 1}],
+            "b": [{"year": self.year, "created": 1, "resolved": 0},
+                  {"year": self.year - 1, "created": 0, "resolved": 0}],
+            "c": [{"year": self.year, "created": 0, "resolved": 0},
+                  {"year": self.year - 1, "created": 0, "resolved": 0}],
+        })
+        self.assertEqual(client.searches,
+                         [("q", "created,resolutiondate,labels", 4, True)])
+
+    def test_assignees_by_display_name_or_name(self):
+        created = f"{self.year}-01-02T00:00:00.000+0000"
+        client = BulkJira([
+            issue(created, assignee={"displayName": "A B", "name": "ab"}),
+            issue(created, assignee={"name": "cd"}),
+            issue(created),
+        ])
+        statistics = component.bulk_statistics(client, self.options, "q", "assignee",
+                                               ["A B", "cd"])
+        self.assertEqual(statistics["A B"][0], {"year": self.year, "created": 1, "resolved": 0})
+        self.assertEqual(statistics["cd"][0], {"year": self.year, "created": 1, "resolved": 0})
+
+    def test_failed_search(self):
+        self.assertIsNone(component.bulk_statistics(BulkJira(None), self.options, "q",
+                                                    "labels", ["a"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
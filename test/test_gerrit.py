@@ -0,0 +1,223 @@
+"""
+Tests for Gerrit statistics, replica selection and account resolution
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+import unittest
+import unittest.mock
+import urllib.error
+import urllib.parse
+
+import gerrit
+import recorder
+
+
+def reply(data):
+    return ")]}'\n" + json.dumps(data)
+
+
+class FakeGerrit:
+    """
+    Gerrit servers answering account and change queries, patched in as gerrit.send
+    """
+    def __init__(self, changes, failing=()):
+        self.changes = changes  # URL -> {owner: [status, ...]}
+        self.failing = failing
+        self.urls = []
+
+    def __call__(self, url, client=None):
+        self.urls.append(url)
+        server = next(server for server in self.changes if url.startswith(server))
+        if server in self.failing:
+            return None, urllib.error.HTTPError(url, 503, "error", {}, None), 0.1
+        query = urllib.parse.unquote(url.split("q=", 1)[1].split("&")[0])
+        if "/a/accounts/" in url:
+            name = query[len("name:\""):-1]
+            return reply([{"_account_id": 1, "name": "A B"}] if name == "A B" else []), None, 0.1
+        owner = query.split("owner:", 1)[1]
+        statuses = self.changes[server].get(owner, [])
+        return reply([{"status": status} for status in statuses]), None, 0.1
+
+
+class StatisticsTest(unittest.TestCase):
+    """
+    Change counts summed over servers
+    """
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache = os.path.join(directory.name, "accounts.json")
+
+    def statistics(self, fake, names):
+        with unittest.mock.patch("gerrit.send", fake):
+            return gerrit.get_statistics(list(fake.changes), names, 2026, cache_file=self.cache)
+
+    def test_counts_are_summed_over_servers(self):
+        fake = FakeGerrit({
+            "https://g1": {"1": ["MERGED", "MERGED", "NEW"]},
+            "https://g2": {"1": ["MERGED", "ABANDONED"]},
+        })
+        self.assertEqual(self.statistics(fake, ["A B"]),
+                         {"A B": {"MERGED": 3, "NEW": 1, "ABANDONED": 1}})
+
+    def test_account_id_or_name_is_queried(self):
+        fake = FakeGerrit({"https://g1": {"1": ["NEW"], "\"C+D\"": ["MERGED"]}})
+        self.assertEqual(self.statistics(fake, ["A B", "C D"]),
+                         {"A B": {"NEW": 1}, "C D": {"MERGED": 1}})
+
+    def test_failed_server(self):
+        fake = FakeGerrit({"https://g1": {"1": ["NEW"]}, "https://g2": {}},
+                          failing=("https://g2",))
+        self.assertEqual(self.statistics(fake, ["A B"]), {"A B": None})
+
+
+def http_error(code):
+    return urllib.error.HTTPError("https://host/", code, "error", {}, None)
+
+
+class ReplicaSetTest(unittest.TestCase):
+    """
+    Ranking of replicas and failover
+    """
+    def setUp(self):
+        self.urls = ["https://r1", "https://r2", "https://r3"]
+        self.replicas = gerrit.ReplicaSet(self.urls)
+        self.replicas.probed = set(self.urls)
+
+    def test_ranked_by_latency_failed_last(self):
+        self.replicas.observe("https://r1", 0.5)
+        self.replicas.observe("https://r2", 0.1)
+        self.replicas.observe("https://r3", 0.01)
+        self.replicas.observe("https://r3", None)
+        self.assertEqual(self.replicas.ranked(), ["https://r2", "https://r1", "https://r3"])
+
+    def test_success_clears_failure(self):
+        self.replicas.observe("https://r1", None)
+        self.replicas.observe("https://r1", 0.2)
+        self.assertNotIn("https://r1", self.replicas.failed)
+
+    def test_moving_latency(self):
+        self.replicas.observe("https://r1", 1.0)
+        self.replicas.observe("https://r1", 2.0)
+        expected = (1 - gerrit.LATENCY_WEIGHT) * 1.0 + gerrit.LATENCY_WEIGHT * 2.0
+        self.assertAlmostEqual(self.replicas.latency["https://r1"], expected)
+
+    def test_fail_over_when_replica_is_down(self):
+        responses = {"https://r1/x": (None, http_error(503), 0.1),
+                     "https://r2/x": ("ok", None, 0.1)}
+        with unittest.mock.patch("gerrit.send",
+                                 side_effect=lambda url, client: responses[url]) as send:
+            self.assertEqual(self.replicas.request("/x"), "ok")
+        self.assertIn("https://r1", self.replicas.failed)
+        self.assertIs(send.call_args_list[0].args[1], self.replicas.single)
+        self.assertEqual(self.replicas.single.retries, 0)
+
+    def test_no_fail_over_on_client_error(self):
+        with unittest.mock.patch("gerrit.send", return_value=(None, http_error(404), 0.1)) as send:
+            self.assertIsNone(self.replicas.request("/x"))
+        self.assertEqual(send.call_count, 1)
+        self.assertEqual(self.replicas.failed, {})
+
+    def test_last_replica_uses_retries(self):
+        self.replicas.failed = {url: time.monotonic() for url in self.urls}
+        with unittest.mock.patch("gerrit.send",
+                                 return_value=(None, urllib.error.URLError("down"), 0.1)) as send:
+            self.assertIsNone(self.replicas.request("/x"))
+        clients = [call.args[1] for call in send.call_args_list]
+        self.assertEqual(clients[-1], self.replicas.client)
+        self.assertEqual(len(clients), 3)
+
+    def test_replica_down(self):
+        self.assertTrue(gerrit.replica_down(http_error(502)))
+        self.assertTrue(gerrit.replica_down(urllib.error.URLError("refused")))
+        self.assertFalse(gerrit.replica_down(http_error(400)))
+        self.assertFalse(gerrit.replica_down(None))
+
+
+class FakeServer:
+    """
+    Gerrit server answering account queries with fixed accounts
+    """
+    def __init__(self, accounts):
+        self.accounts = accounts
+        self.requests = 0
+
+    def __str__(self):
+        return "https://gerrit.example.com"
+
+    def request(self, path):
+        self.requests += 1
+        return ")]}'\n" + json.dumps(self.accounts)
+
+
+class FindAccountTest(unittest.TestCase):
+    """
+    Only exact full name matches are accepted
+    """
+    def test_exact_match(self):
+        server = FakeServer([{"_account_id": 1, "name": "A B"}, {"_account_id": 2, "name": "A Bc"}])
+        self.assertEqual(gerrit.find_account(server, "A B"), 1)
+
+    def test_single_fuzzy_match_is_rejected(self):
+        server = FakeServer([{"_account_id": 2, "name": "A Bc"}])
+        self.assertIsNone(gerrit.find_account(server, "A B"))
+
+    def test_ambiguous_match_is_rejected(self):
+        server = FakeServer([{"_account_id": 1, "name": "C"}, {"_account_id": 2, "name": "C"}])
+        self.assertIsNone(gerrit.find_account(server, "C"))
+
+
+class ResolveAccountsTest(unittest.TestCase):
+    """
+    Account IDs are cached per server until they expire
+    """
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.cache = os.path.join(directory.name, "cache", "accounts.json")
+        self.server = FakeServer([{"_account_id": 1, "name": "A B"}])
+
+    def test_cached_id_is_reused(self):
+        self.assertEqual(gerrit.resolve_accounts(self.server, ["A B"], self.cache), {"A B": 1})
+        self.assertEqual(gerrit.resolve_accounts(self.server, ["A B"], self.cache), {"A B": 1})
+        self.assertEqual(self.server.requests, 1)
+        cached = gerrit.load_accounts(self.cache)[str(self.server)]["A B"]
+        self.assertEqual(cached["id"], 1)
+
+    def test_expired_id_is_resolved_again(self):
+        gerrit.save_accounts(self.cache, {str(self.server): {
+            "A B": {"id": 7, "time": time.time() - 2 * 24 * 60 * 60}}})
+        self.assertEqual(gerrit.resolve_accounts(self.server, ["A B"], self.cache, ttl=1),
+                         {"A B": 1})
+        self.assertEqual(self.server.requests, 1)
+
+    def test_unresolved_name_is_not_cached(self):
+        self.assertEqual(gerrit.resolve_accounts(self.server, ["C D"], self.cache), {"C D": None})
+        gerrit.resolve_accounts(self.server, ["C D"], self.cache)
+        self.assertEqual(self.server.requests, 2)
+        self.assertFalse(os.path.exists(self.cache))
+
+    def test_cache_is_skipped_while_recording(self):
+        gerrit.save_accounts(self.cache, {str(self.server): {
+            "A B": {"id": 7, "time": time.time()}}})
+        recorder.configure(argparse.Namespace(record=os.path.join(self.directory, "traffic")))
+        self.addCleanup(recorder.configure, argparse.Namespace())
+        self.assertEqual(gerrit.resolve_accounts(self.server, ["A B", "C D"], self.cache),
+                         {"A B": 1, "C D": None})
+        self.assertEqual(self.server.requests, 2)
+        self.assertEqual(gerrit.load_accounts(self.cache)[str(self.server)]["A B"]["id"], 7)
+
+    def test_broken_cache_is_ignored(self):
+        os.makedirs(os.path.dirname(self.cache))
+        with open(self.cache, "w") as cache_file:
+            cache_file.write("{")
+        self.assertEqual(gerrit.resolve_accounts(self.server, ["A B"], self.cache), {"A B": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
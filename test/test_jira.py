@@ -0,0 +1,451 @@
+"""
+Tests for Jira REST API helpers
+"""
+
+import argparse
+import concurrent.futures
+import datetime
+import json
+import unittest
+import urllib.error
+import urllib.parse
+
+import component
+import jira
+import transport
+
+
+class CloudJira(jira.Jira):
+    """
+    Jira Cloud answering searches and counts from a list of issues without network
+    """
+    def __init__(self, issues, **kwargs):
+        super().__init__("https://cloud.example.com", api=jira.API_CLOUD, **kwargs)
+        self.issues = issues
+        self.requests = []
+
+    def request(self, rest, data=None, method=None, idempotent=None):
+        self.requests.append((rest, data))
+        path, _, query = rest.partition("?")
+        params = dict(urllib.parse.parse_qsl(query))
+        if path == "rest/api/3/search/approximate-count":
+            return json.dumps({"count": len(self.issues)})
+        start = int(params.get("nextPageToken", 0))
+        end = start + int(params["maxResults"])
+        page = {"issues": self.issues[start:end], "isLast": end >= len(self.issues)}
+        if end < len(self.issues):
+            page["nextPageToken"] = str(end)
+        return json.dumps(page)
+
+
+class CountResponse:
+    """
+    HTTP response with approximate count body
+    """
+    status = 200
+    headers = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        return False
+
+    def read(self):
+        return b'{"count": 42}'
+
+
+class UnavailableOnceOpener:
+    """
+    Opener failing with HTTP 503 on the first call
+    """
+    def __init__(self):
+        self.calls = 0
+
+    def open(self, req, timeout=None):
+        self.calls += 1
+        if self.calls == 1:
+            raise urllib.error.HTTPError(req.full_url, 503, "Service Unavailable", {}, None)
+        return CountResponse()
+
+
+class CloudSearchTest(unittest.TestCase):
+    """
+    Token paged search and approximate count on Jira Cloud
+    """
+    def setUp(self):
+        self.issues = [{"key": f"P-{i}"} for i in range(25)]
+        self.client = CloudJira(self.issues)
+
+    def test_token_paging(self):
+        issues = self.client.search_cloud("project = P", "labels", page_size=10)
+        self.assertEqual(issues, self.issues)
+        self.assertEqual(len(self.client.requests), 3)
+        self.assertNotIn("nextPageToken", self.client.requests[0][0])
+        self.assertIn("nextPageToken=10", self.client.requests[1][0])
+        self.assertIn("nextPageToken=20", self.client.requests[2][0])
+
+    def test_limit_stops_paging(self):
+        issues = self.client.search_cloud("project = P", "labels", page_size=10, limit=10)
+        self.assertEqual(len(issues), 10)
+        self.assertEqual(len(self.client.requests), 1)
+
+    def test_failed_page(self):
+        self.client.request = lambda *args, **kwargs: None
+        self.assertIsNone(self.client.search_cloud("project = P", "labels", page_size=10))
+
+    def test_count(self):
+        self.assertEqual(self.client.count("project = P"), 25)
+        rest, data = self.client.requests[0]
+        self.assertEqual(rest, "rest/api/3/search/approximate-count")
+        self.assertEqual(data, {"jql": "project = P"})
+
+    def test_invalid_count(self):
+        self.client.request = lambda *args, **kwargs: "{}"
+        self.assertIsNone(self.client.count_cloud("project = P"))
+
+    def test_count_is_retried(self):
+        client = jira.Jira("https://count-retry.example.com", token="secret", api=jira.API_CLOUD,
+                           client=transport.Transport(backoff=0))
+        client.opener = UnavailableOnceOpener()
+        self.assertEqual(client.count_cloud("project = P"), 42)
+        self.assertEqual(client.opener.calls, 2)
+
+
+class ShardJira(jira.Jira):
+    """
+    Jira counting issues of a fixed list of created dates without network
+    """
+    def __init__(self, dates, fail=False):
+        super().__init__("https://shards.example.com")
+        self.dates = dates
+        self.fail = fail
+        self.queries = 0
+
+    def shard_query(self, query, start, end, order=""):
+        return start, end
+
+    def count(self, query):
+        self.queries += 1
+        if self.fail:
+            return None
+        start, end = query
+        return sum(1 for date in self.dates if start <= date < end)
+
+
+class PlanShardsTest(unittest.TestCase):
+    """
+    Splitting created date range into shards of limited size
+    """
+    start = datetime.datetime(2020, 1, 1)
+
+    def plan(self, dates, size, fail=False):
+        client = ShardJira(dates, fail)
+        end = max(dates) + datetime.timedelta(days=1)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=2) as pool:
+            return client, client.plan_shards(pool, "q", self.start, end, len(dates), size)
+
+    def test_shards_cover_all_issues(self):
+        dates = [self.start + datetime.timedelta(hours=7 * i) for i in range(1000)]
+        client, shards = self.plan(dates, 100)
+        self.assertEqual(shards, sorted(shards))
+        counts = [client.count(shard) for shard in shards]
+        self.assertEqual(sum(counts), len(dates))
+        self.assertTrue(all(count <= 100 for count in counts))
+        for (_, high), (low, _) in zip(shards, shards[1:]):
+            self.assertLessEqual(high, low)
+
+    def test_skewed_dates_are_split_further(self):
+        dates = [self.start + datetime.timedelta(days=i) for i in range(50)]
+        dates += [self.start + datetime.timedelta(days=300, minutes=i) for i in range(500)]
+        client, shards = self.plan(dates, 100)
+        counts = [client.count(shard) for shard in shards]
+        self.assertEqual(sum(counts), len(dates))
+        self.assertTrue(all(count <= 100 for count in counts))
+
+    def test_terminates_at_minimal_span(self):
+        dates = [self.start + datetime.timedelta(days=10)] * 500
+        client, shards = self.plan(dates, 100)
+        self.assertEqual(len(shards), 1)
+        low, high = shards[0]
+        self.assertLessEqual(high - low, jira.SHARD_MIN_SPAN)
+        self.assertEqual(client.count(shards[0]), 500)
+
+    def test_failed_count(self):
+        dates = [self.start + datetime.timedelta(days=i) for i in range(10)]
+        _, shards = self.plan(dates, 5, fail=True)
+        self.assertIsNone(shards)
+
+
+class ShardedSearchJira(jira.Jira):
+    """
+    Jira recording whether search was sharded or serial
+    """
+    def __init__(self, total, workers=4):
+        super().__init__("https://sharded.example.com", workers=workers)
+        self.total = total
+        self.counted = []
+        self.calls = []
+
+    def count(self, query):
+        self.counted.append(query)
+        return self.total
+
+    def search_sharded(self, query, fields, total, page_size=None):
+        self.calls.append(("sharded", total))
+        return []
+
+    def search_serial(self, query, fields, page_size=None, limit=None):
+        self.calls.append(("serial", None))
+        return []
+
+
+class SearchShardingTest(unittest.TestCase):
+    """
+    Large searches are counted first and fetched in shards
+    """
+    def test_large_search_is_counted_and_sharded(self):
+        client = ShardedSearchJira(jira.SHARD_THRESHOLD + 1)
+        client.search("q", "labels", large=True)
+        self.assertEqual(client.counted, ["q"])
+        self.assertEqual(client.calls, [("sharded", jira.SHARD_THRESHOLD + 1)])
+
+    def test_small_large_search_is_serial(self):
+        client = ShardedSearchJira(10)
+        client.search("q", "labels", large=True)
+        self.assertEqual(client.calls, [("serial", None)])
+
+    def test_search_without_hint_is_not_counted(self):
+        client = ShardedSearchJira(jira.SHARD_THRESHOLD + 1)
+        client.search("q", "labels")
+        self.assertEqual(client.counted, [])
+        self.assertEqual(client.calls, [("serial", None)])
+
+    def test_known_total_skips_count(self):
+        client = ShardedSearchJira(None)
+        client.search("q", "labels", total=jira.SHARD_THRESHOLD + 5)
+        self.assertEqual(client.counted, [])
+        self.assertEqual(client.calls, [("sharded", jira.SHARD_THRESHOLD + 5)])
+
+    def test_single_worker_is_serial(self):
+        client = ShardedSearchJira(jira.SHARD_THRESHOLD + 1, workers=1)
+        client.search("q", "labels", large=True)
+        self.assertEqual(client.counted, [])
+        self.assertEqual(client.calls, [("serial", None)])
+
+    def test_label_estimates_may_shard(self):
+        client = ShardedSearchJira(jira.SHARD_THRESHOLD + 1)
+        options = argparse.Namespace(project="P", component="C")
+        self.assertEqual(component.label_estimates(client, options, "l"),
+                         {"hours": 0, "issues": 0})
+        self.assertEqual(client.calls, [("sharded", jira.SHARD_THRESHOLD + 1)])
+
+
+class GadgetJira(jira.Jira):
+    """
+    Jira answering gadget requests with fixed response body and HTTP status
+    """
+    def __init__(self, body, status=200):
+        super().__init__("https://gadget.example.com")
+        self.body = body
+        self.status = status
+        self.requests = []
+
+    def request_status(self, rest, data=None, method=None, idempotent=None):
+        self.requests.append(rest)
+        return self.body, self.status
+
+
+class CreatedVsResolvedTest(unittest.TestCase):
+    """
+    Yearly created and resolved counts from one gadget request
+    """
+    def test_parse_rows(self):
+        client = GadgetJira(json.dumps({"data": [
+            {"period": "2025", "createdValue": 7, "resolvedValue": 5},
+            {"period": "01/Jan/2026", "created": 3, "resolved": 0},
+        ]}))
+        self.assertEqual(client.created_vs_resolved("project = P", 2), {
+            2025: {"created": 7, "resolved": 5},
+            2026: {"created": 3, "resolved": 0},
+        })
+        self.assertIn("periodName=yearly", client.requests[0])
+
+    def test_not_found_disables_gadget(self):
+        client = GadgetJira(None, 404)
+        self.assertIsNone(client.created_vs_resolved("project = P", 2))
+        self.assertIsNone(client.created_vs_resolved("project = Q", 2))
+        self.assertEqual(len(client.requests), 1)
+
+    def test_unparseable_body_disables_gadget(self):
+        for body in ("<html>", json.dumps({"data": [{"period": "x"}]}), json.dumps({})):
+            client = GadgetJira(body)
+            self.assertIsNone(client.created_vs_resolved("project = P", 2))
+            self.assertIs(client.gadgets["createdVsResolved"], False)
+
+    def test_transient_failure_keeps_gadget(self):
+        client = GadgetJira(None, 503)
+        self.assertIsNone(client.created_vs_resolved("project = P", 2))
+        self.assertNotIn("createdVsResolved", client.gadgets)
+        client.body, client.status = json.dumps({"data": [
+            {"period": "2026", "created": 1, "resolved": 1}]}), 200
+        self.assertEqual(client.created_vs_resolved("project = P", 1),
+                         {2026: {"created": 1, "resolved": 1}})
+
+    def test_network_failure_keeps_gadget(self):
+        client = GadgetJira(None, None)
+        self.assertIsNone(client.created_vs_resolved("project = P", 2))
+        self.assertNotIn("createdVsResolved", client.gadgets)
+
+
+class FilterJira(jira.Jira):
+    """
+    Jira with saved filters and two-dimensional filter statistics without network
+    """
+    def __init__(self, table):
+        super().__init__("https://filters.example.com")
+        self.table = table
+        self.requests = []
+
+    def request(self, rest, data=None, method=None, idempotent=None):
+        self.requests.append((method or ("POST" if data is not None else "GET"), rest, data))
+        if rest == "rest/api/2/filter":
+            return json.dumps({"id": "10500", "name": data["name"]})
+        if rest.startswith("rest/api/2/filter/"):
+            return "" if method == "DELETE" else json.dumps({"id": "10500"})
+        return self.table
+
+
+def cell(markup):
+    return {"markup": markup}
+
+
+class FilterStatisticsTest(unittest.TestCase):
+    """
+    Matrix of counts per name from temporary filter
+    """
+    table = json.dumps({"table": {"rows": [
+        {"cells": [cell("<a href='/u/1'>A &amp; B</a>"), cell("<a>3</a>"), cell("2")]},
+        {"cells": [cell("<span>C D</span>"), cell("0"), cell("-")]},
+        {"cells": []},
+    ]}})
+
+    def test_parse_matrix(self):
+        client = FilterJira(self.table)
+        self.assertEqual(client.filter_statistics("project = P", "assignees"),
+                         {"A & B": 5, "C D": 0})
+        method, rest, _ = client.requests[-1]
+        self.assertEqual(method, "GET")
+        self.assertTrue(rest.startswith("rest/gadget/1.0/twodimensionalfilterstats/generate?"))
+        self.assertIn("filterId=filter-10500", rest)
+        self.assertIn("ystattype=assignees", rest)
+
+    def test_filter_lifecycle(self):
+        client = FilterJira(self.table)
+        client.filter_statistics("project = P", "labels")
+        client.filter_statistics("project = Q", "labels")
+        client.close()
+        client.close()
+        filters = [(method, rest, data) for method, rest, data in client.requests
+                   if rest.startswith("rest/api/2/filter")]
+        self.assertEqual(filters, [
+            ("POST", "rest/api/2/filter", {"name": client.filter_name, "jql": "project = P"}),
+            ("PUT", "rest/api/2/filter/10500",
+             {"name": client.filter_name, "jql": "project = Q"}),
+            ("DELETE", "rest/api/2/filter/10500", None),
+        ])
+        self.assertIsNone(client.filter_id)
+
+    def test_filter_names_are_unique_per_run(self):
+        self.assertNotEqual(FilterJira(self.table).filter_name,
+                            FilterJira(self.table).filter_name)
+
+    def test_close_without_filter(self):
+        client = FilterJira(self.table)
+        client.close()
+        self.assertEqual(client.requests, [])
+
+    def test_missing_table_disables_gadget(self):
+        client = FilterJira(json.dumps({"table": {}}))
+        self.assertIsNone(client.filter_statistics("project = P", "labels"))
+        requests = len(client.requests)
+        self.assertIsNone(client.filter_statistics("project = P", "labels"))
+        self.assertEqual(len(client.requests), requests)
+
+
+class ComponentLabelsTest(unittest.TestCase):
+    """
+    Component labels come in stable order for reproducible queries
+    """
+    def test_labels_are_sorted(self):
+        client = jira.Jira("https://labels.example.com", workers=1)
+        issues = [{"fields": {"labels": ["b", "c"]}}, {"fields": {"labels": ["a", "b"]}}]
+        client.search = lambda *args, **kwargs: issues
+        self.assertEqual(client.get_component_labels("P", "C"), ["a", "b", "c"])
+
+    def test_failed_search(self):
+        client = jira.Jira("https://labels.example.com", workers=1)
+        client.search = lambda *args, **kwargs: None
+        self.assertEqual(client.get_component_labels("P", "C"), [])
+
+
+class PageTunerTest(unittest.TestCase):
+    """
+    Page size adapts to response time and respects server cap
+    """
+    def setUp(self):
+        self.url = f"https://pages-{self.id()}.example.com"
+        self.tuner = jira.PageTuner(self.url, size=100, target=2.0)
+
+    def tearDown(self):
+        jira.MAX_RESULTS.pop(self.url, None)
+
+    def test_fast_pages_grow_at_most_twice(self):
+        self.tuner.observe(100, 100, 0.1, 1000, last=False)
+        self.assertEqual(self.tuner.size(), 200)
+
+    def test_slow_pages_shrink_at_most_half(self):
+        self.tuner.observe(100, 100, 10.0, 1000, last=False)
+        self.assertEqual(self.tuner.size(), 50)
+
+    def test_large_pages_shrink(self):
+        self.tuner.observe(100, 100, 0.1, jira.PAGE_BYTES * 3 // 2, last=False)
+        self.assertEqual(self.tuner.size(), 66)
+
+    def test_bounds(self):
+        for _ in range(20):
+            self.tuner.observe(self.tuner.size(), self.tuner.size(), 0.01, 10, last=False)
+        self.assertEqual(self.tuner.size(), jira.MAX_PAGE_SIZE)
+        for _ in range(20):
+            self.tuner.observe(self.tuner.size(), self.tuner.size(), 100, 10, last=False)
+        self.assertEqual(self.tuner.size(), jira.MIN_PAGE_SIZE)
+
+    def test_last_page_is_ignored(self):
+        self.tuner.observe(100, 30, 0.1, 1000, last=True)
+        self.assertEqual(self.tuner.size(), 100)
+
+    def test_cap_from_response(self):
+        self.tuner.observe(200, 50, 0.1, 1000, last=False, cap=50)
+        self.assertEqual(self.tuner.size(), 50)
+        self.assertEqual(jira.MAX_RESULTS[self.url], 50)
+
+    def test_cap_from_short_page(self):
+        self.tuner.observe(100, 80, 0.1, 1000, last=False)
+        self.assertEqual(self.tuner.size(), 80)
+
+
+class CheckFieldsTest(unittest.TestCase):
+    """
+    Searches require explicit field projection
+    """
+    def test_rejects_missing_and_wildcard_fields(self):
+        for fields in ("", None, "*all", "*navigable"):
+            with self.assertRaises(ValueError):
+                jira.check_fields(fields)
+
+    def test_accepts_field_list(self):
+        jira.check_fields("labels,timetracking")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+"""
+Tests for command line parsing of global options
+"""
+
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+import launcher
+import recorder
+
+
+class GlobalOptionsTest(unittest.TestCase):
+    """
+    Global options are accepted before and after the command
+    """
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.config = os.path.join(directory.name, "gojira.cfg")
+        with open(self.config, "w") as config_file:
+            config_file.write("{}")
+
+    def parse(self, *argv):
+        gojira = launcher.Launcher()
+        gojira.parse_arguments(["--config", self.config, *argv])
+        return gojira.options
+
+    def test_profile_before_command(self):
+        options = self.parse("--profile", "cpu", "--profile-top", "5", "jira")
+        self.assertEqual(options.profile, "cpu")
+        self.assertEqual(options.profile_top, 5)
+
+    def test_profile_after_command(self):
+        options = self.parse("gerrit", "--profile", "mem")
+        self.assertEqual(options.profile, "mem")
+
+    def test_defaults(self):
+        options = self.parse("all")
+        self.assertIsNone(options.profile)
+        self.assertEqual(options.profile_top, 20)
+        self.assertEqual(options.config, self.config)
+
+    def test_record_before_command(self):
+        options = self.parse("--record", "traffic", "jira")
+        self.assertEqual(options.record, "traffic")
+        self.assertIsNone(options.replay)
+
+    def test_replay_after_command(self):
+        options = self.parse("all", "--replay", "traffic", "--replay-latency")
+        self.assertEqual(options.replay, "traffic")
+        self.assertTrue(options.replay_latency)
+
+    def test_record_activates_recorder(self):
+        directory = os.path.join(os.path.dirname(self.config), "traffic")
+        options = self.parse("--record", directory, "gerrit")
+        self.addCleanup(recorder.configure, self.parse("gerrit"))
+        self.assertFalse(recorder.configure(options).replaying)
+        self.assertTrue(os.path.isdir(directory))
+
+    def test_record_and_replay_are_exclusive(self):
+        with contextlib.redirect_stderr(io.StringIO()):
+            with self.assertRaises(SystemExit):
+                self.parse("--record", "a", "--replay", "b", "jira")
+
+    def test_transport_before_command(self):
+        options = self.parse("--retries", "7", "jira")
+        self.assertEqual(options.retries, 7)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+"""
+Tests for cost-based planner strategy selection
+"""
+
+import unittest
+
+import jira
+import planner
+
+
+class FakeJira:
+    """
+    Jira answering probes with fixed total and latency without network
+    """
+    def __init__(self, total, latency=0.1, cloud=False, workers=1):
+        self.total = total
+        self.latency = latency
+        self.cloud = cloud
+        self.workers = workers
+        self.gadgets = {}
+        self.pages = jira.PageTuner("https://planner.example.com")
+        self.stats = {"requests": 0, "bytes": 0, "seconds": 0.0}
+
+    def count(self, query):
+        self.stats["requests"] += 1
+        self.stats["seconds"] += self.latency
+        return self.total
+
+    def is_cloud(self):
+        return self.cloud
+
+
+class PlannerTest(unittest.TestCase):
+    """
+    Cheapest strategy is chosen from probed totals
+    """
+    def test_count_for_few_cells_of_large_result(self):
+        plan = planner.Planner(FakeJira(1000000, cloud=True)).plan_statistics("t", 2, 1, "q")
+        self.assertEqual(plan.strategy, planner.COUNT)
+
+    def test_bulk_for_small_result(self):
+        plan = planner.Planner(FakeJira(50, cloud=True)).plan_statistics("t", 10, 5, "q")
+        self.assertEqual(plan.strategy, planner.BULK)
+        self.assertEqual(plan.total, 50)
+
+    def test_gadget_on_server(self):
+        plan = planner.Planner(FakeJira(1000000)).plan_statistics("t", 3, 5, "q")
+        self.assertEqual(plan.strategy, planner.GADGET)
+
+    def test_unavailable_gadget_is_skipped(self):
+        client = FakeJira(1000000)
+        client.gadgets["createdVsResolved"] = False
+        plan = planner.Planner(client).plan_statistics("t", 3, 5, "q")
+        self.assertEqual(plan.strategy, planner.COUNT)
+
+    def test_matrix_only_with_filters_allowed(self):
+        plan = planner.Planner(FakeJira(1000000)).plan_statistics("t", 100, 1, "q")
+        self.assertEqual(plan.strategy, planner.GADGET)
+        plan = planner.Planner(FakeJira(1000000), filters=True).plan_statistics("t", 100, 1, "q")
+        self.assertEqual(plan.strategy, planner.MATRIX)
+
+    def test_failed_probe_has_no_bulk_plan(self):
+        plan = planner.Planner(FakeJira(None, cloud=True)).plan_statistics("t", 10, 5, "q")
+        self.assertEqual(plan.strategy, planner.COUNT)
+
+    def test_probe_measures_latency(self):
+        client_planner = planner.Planner(FakeJira(10, latency=0.25))
+        self.assertEqual(client_planner.probe("q"), 10)
+        self.assertAlmostEqual(client_planner.latency, 0.25)
+
+    def test_estimates(self):
+        plan = planner.Planner(FakeJira(5000)).plan_estimates("t", 100, "q")
+        self.assertEqual(plan.strategy, planner.BULK)
+        plan = planner.Planner(FakeJira(None)).plan_estimates("t", 100, "q")
+        self.assertEqual(plan.strategy, planner.COUNT)
+
+
+if __name__ == "__main__":
+    unittest.main()
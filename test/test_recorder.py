@@ -0,0 +1,72 @@
+"""
+Tests for HTTP record/replay
+"""
+
+import os
+import tempfile
+import unittest
+import urllib.request
+
+import recorder
+
+
+class RecorderTest(unittest.TestCase):
+    """
+    Request keys, credential scrubbing and replay of recorded responses
+    """
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_key_is_stable(self):
+        first = urllib.request.Request("https://host/a?q=1")
+        second = urllib.request.Request("https://host/a?q=1")
+        second.add_header("Authorization", "Bearer secret")
+        self.assertEqual(recorder.request_key(first), recorder.request_key(second))
+
+    def test_key_depends_on_method_url_and_body(self):
+        keys = {
+            recorder.request_key(urllib.request.Request("https://host/a")),
+            recorder.request_key(urllib.request.Request("https://host/b")),
+            recorder.request_key(urllib.request.Request("https://host/a", method="DELETE")),
+            recorder.request_key(urllib.request.Request("https://host/a", data=b"{}")),
+        }
+        self.assertEqual(len(keys), 4)
+
+    def test_scrub(self):
+        headers = recorder.scrub({"Authorization": "Bearer x", "Cookie": "y", "Accept": "z"})
+        self.assertEqual(headers, {"Authorization": recorder.SCRUBBED,
+                                   "Cookie": recorder.SCRUBBED, "Accept": "z"})
+        self.assertEqual(recorder.scrub(None), {})
+
+    def test_replay_recorded_response(self):
+        req = urllib.request.Request("https://host/a")
+        req.add_header("Authorization", "Bearer secret")
+        recorder.Recorder(self.directory.name).record(req, "body", elapsed=0.5, status=200)
+        replay = recorder.Recorder(self.directory.name, replaying=True)
+        self.assertEqual(replay.replay(urllib.request.Request("https://host/a")),
+                         ("body", 0.5, 200))
+        with open(replay.path(req), "r") as record_file:
+            self.assertNotIn("secret", record_file.read())
+
+    def test_replay_missing_response(self):
+        replay = recorder.Recorder(self.directory.name, replaying=True)
+        self.assertEqual(replay.replay(urllib.request.Request("https://host/a")),
+                         (None, 0.0, None))
+
+    def test_replay_failed_response_status(self):
+        req = urllib.request.Request("https://host/a")
+        recorder.Recorder(self.directory.name).record(req, None, status=404)
+        replay = recorder.Recorder(self.directory.name, replaying=True)
+        self.assertEqual(replay.replay(req), (None, 0.0, 404))
+
+    def test_run_id_is_replayed(self):
+        recording = recorder.Recorder(self.directory.name)
+        replay = recorder.Recorder(self.directory.name, replaying=True)
+        self.assertEqual(replay.run_id, recording.run_id)
+        other = recorder.Recorder(os.path.join(self.directory.name, "other"))
+        self.assertNotEqual(other.run_id, recording.run_id)
+
+
+if __name__ == "__main__":
+    unittest.main()
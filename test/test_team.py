@@ -0,0 +1,42 @@
+"""
+Tests for combined Jira and Gerrit team report
+"""
+
+import contextlib
+import io
+import unittest
+
+import team
+
+
+class ReportTest(unittest.TestCase):
+    """
+    One line per person with Jira cells and Gerrit counts
+    """
+    def report(self, jira_statistics, gerrit_statistics):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            team.report(jira_statistics, gerrit_statistics)
+        return output.getvalue().splitlines()
+
+    def test_report(self):
+        lines = self.report(
+            {"A B": [{"year": 2026, "created": 3, "resolved": 2},
+                     {"year": 2025, "created": None, "resolved": 1}]},
+            {"A B": {"MERGED": 5, "ABANDONED": 1}})
+        self.assertIn("2026", lines[1])
+        self.assertIn("2025", lines[1])
+        self.assertEqual(lines[2].split(), ["A", "B", "3/2", "ERR/1", "5", ".", "1"])
+
+    def test_failed_gerrit(self):
+        lines = self.report({"A B": [{"year": 2026, "created": 0, "resolved": 0}]},
+                            {"A B": None})
+        self.assertEqual(lines[2].split(), ["A", "B", "0/0", "ERR", "ERR", "ERR"])
+
+    def test_missing_gerrit_person(self):
+        lines = self.report({"A B": [{"year": 2026, "created": 0, "resolved": 0}]}, {})
+        self.assertEqual(lines[2].split()[-3:], ["ERR", "ERR", "ERR"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,237 @@
+"""
+Tests for HTTP transport: circuit breaker, retries, backoff and hedging
+"""
+
+import http.client
+import threading
+import unittest
+import urllib.error
+import urllib.request
+
+import transport
+
+
+class FakeResponse:
+    """
+    Minimal HTTP response usable as context manager
+    """
+    status = 200
+    headers = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        return False
+
+    def read(self):
+        return b"{}"
+
+
+class FakeOpener:
+    """
+    Opener failing with given error (HTTP 503 by default) for the given
+    number of calls, then succeeding
+    """
+    def __init__(self, failures, error=None):
+        self.failures = failures
+        self.error = error
+        self.calls = 0
+
+    def open(self, req, timeout=None):
+        self.calls += 1
+        if self.calls <= self.failures:
+            if self.error is not None:
+                raise self.error
+            raise urllib.error.HTTPError(req.full_url, 503, "Service Unavailable", {}, None)
+        return FakeResponse()
+
+
+class StallingOpener:
+    """
+    Opener whose first call stalls until released, later calls succeed
+    """
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = 0
+        self.lock = threading.Lock()
+        self.released = threading.Event()
+
+    def open(self, req, timeout=None):
+        with self.lock:
+            self.calls += 1
+            first = self.calls == 1
+        if first:
+            self.released.wait(5)
+        if self.fail:
+            raise urllib.error.URLError("refused")
+        return FakeResponse()
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    """
+    Circuit breaker state transitions
+    """
+    def test_opens_after_threshold(self):
+        breaker = transport.CircuitBreaker("host", threshold=3, cooldown=60)
+        breaker.failure()
+        breaker.failure()
+        self.assertTrue(breaker.allow())
+        breaker.failure()
+        self.assertTrue(breaker.is_open())
+        self.assertFalse(breaker.allow())
+
+    def test_success_resets_failures(self):
+        breaker = transport.CircuitBreaker("host", threshold=2, cooldown=60)
+        breaker.failure()
+        breaker.success()
+        breaker.failure()
+        self.assertFalse(breaker.is_open())
+
+    def test_half_open_allows_single_trial(self):
+        breaker = transport.CircuitBreaker("host", threshold=1, cooldown=0)
+        breaker.failure()
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+
+    def test_failed_trial_reopens(self):
+        breaker = transport.CircuitBreaker("host", threshold=1, cooldown=60)
+        breaker.failure()
+        breaker.cooldown = 0
+        self.assertTrue(breaker.allow())
+        breaker.cooldown = 60
+        breaker.failure()
+        self.assertTrue(breaker.is_open())
+        self.assertFalse(breaker.allow())
+
+    def test_successful_trial_closes(self):
+        breaker = transport.CircuitBreaker("host", threshold=1, cooldown=0)
+        breaker.failure()
+        self.assertTrue(breaker.allow())
+        breaker.success()
+        self.assertFalse(breaker.is_open())
+        self.assertTrue(breaker.allow())
+
+
+class BreakerTrialTest(unittest.TestCase):
+    """
+    Half-open trial ending with unexpected error does not block the host
+    """
+    def test_unexpected_error_ends_trial(self):
+        client = transport.Transport(retries=0, backoff=0,
+                                     breaker_threshold=1, breaker_cooldown=0)
+        req = urllib.request.Request("http://breaker-trial.example.com/")
+        with self.assertRaises(urllib.error.URLError):
+            client.fetch(FakeOpener(1, urllib.error.URLError("refused")), req)
+        with self.assertRaises(ValueError):
+            client.fetch(FakeOpener(1, ValueError("broken")), req)
+        breaker = transport.get_breaker("breaker-trial.example.com")
+        self.assertFalse(breaker.trial)
+        self.assertTrue(breaker.allow())
+
+
+class DelayTest(unittest.TestCase):
+    """
+    Backoff delay with jitter and Retry-After
+    """
+    def setUp(self):
+        self.transport = transport.Transport(backoff=1, max_backoff=30)
+
+    def http_error(self, headers):
+        return urllib.error.HTTPError("http://host/", 429, "Too Many Requests", headers, None)
+
+    def test_jitter_within_exponential_bound(self):
+        for attempt in range(4):
+            self.assertLessEqual(self.transport.delay(attempt), 2 ** attempt)
+
+    def test_retry_after_is_honoured(self):
+        delay = self.transport.delay(0, self.http_error({"Retry-After": "7"}))
+        self.assertGreaterEqual(delay, 7)
+
+    def test_retry_after_is_capped(self):
+        delay = self.transport.delay(0, self.http_error({"Retry-After": "100"}))
+        self.assertEqual(delay, 30)
+
+    def test_invalid_retry_after_is_ignored(self):
+        self.assertIsNone(transport.retry_after(self.http_error({"Retry-After": "soon"})))
+        self.assertLessEqual(self.transport.delay(0, self.http_error({"Retry-After": "soon"})), 1)
+
+
+class HedgeTest(unittest.TestCase):
+    """
+    Slow request is duplicated and the first success wins
+    """
+    def setUp(self):
+        self.transport = transport.Transport(hedge=0.05)
+        self.req = urllib.request.Request("http://hedge.example.com/")
+
+    def test_duplicate_answers_first(self):
+        opener = StallingOpener()
+        try:
+            response = self.transport.send_hedged(opener, self.req)
+        finally:
+            opener.released.set()
+        self.assertEqual(response.status, 200)
+        self.assertEqual(opener.calls, 2)
+
+    def test_all_attempts_failing(self):
+        opener = StallingOpener(fail=True)
+        opener.released.set()
+        with self.assertRaises(urllib.error.URLError):
+            self.transport.send_hedged(opener, self.req)
+
+
+class RetryableTest(unittest.TestCase):
+    """
+    Classification of errors worth retrying
+    """
+    def http_error(self, code):
+        return urllib.error.HTTPError("http://host/", code, "error", {}, None)
+
+    def test_server_errors(self):
+        self.assertTrue(transport.is_retryable(self.http_error(503)))
+        self.assertTrue(transport.is_retryable(self.http_error(429)))
+
+    def test_client_errors(self):
+        self.assertFalse(transport.is_retryable(self.http_error(404)))
+
+    def test_connection_errors(self):
+        self.assertTrue(transport.is_retryable(urllib.error.URLError("refused")))
+        self.assertTrue(transport.is_retryable(http.client.IncompleteRead(b"")))
+        self.assertTrue(transport.is_retryable(TimeoutError()))
+
+    def test_open_circuit(self):
+        self.assertFalse(transport.is_retryable(transport.CircuitOpenError("open")))
+
+
+class FetchTest(unittest.TestCase):
+    """
+    Retries of idempotent and non-idempotent requests
+    """
+    def setUp(self):
+        self.transport = transport.Transport(retries=3, backoff=0, breaker_threshold=100)
+
+    def test_get_is_retried(self):
+        opener = FakeOpener(failures=2)
+        req = urllib.request.Request("http://fetch-get.example.com/")
+        response = self.transport.fetch(opener, req)
+        self.assertEqual(response.status, 200)
+        self.assertEqual(opener.calls, 3)
+
+    def test_get_gives_up_after_retries(self):
+        opener = FakeOpener(failures=10)
+        req = urllib.request.Request("http://fetch-fail.example.com/")
+        with self.assertRaises(urllib.error.HTTPError):
+            self.transport.fetch(opener, req)
+        self.assertEqual(opener.calls, 4)
+
+    def test_post_is_not_retried(self):
+        opener = FakeOpener(failures=1)
+        req = urllib.request.Request("http://fetch-post.example.com/", data=b"{}")
+        with self.assertRaises(urllib.error.HTTPError):
+            self.transport.fetch(opener, req)
+        self.assertEqual(opener.calls, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()